@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+import time as timer
+from contextlib import redirect_stdout
+from multiprocessing.connection import wait
+
+
+def run_worker(solve, filename, memory_limit, conn):
+    """Entry point of a worker process: solve one instance and send the result through conn."""
+    if memory_limit:
+        import resource
+        limit = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    start_time = timer.time()
+    try:
+        # the solvers report their progress on stdout, which is not wanted from many processes at once
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            cost = solve(filename)
+        if isinstance(cost, dict):
+            result = cost   # the status and further measurements of the solve
+        elif cost is None:
+            result = {'status': 'timeout'}
+        else:
+            result = {'status': 'solved', 'cost': cost}
+    except MemoryError:
+        result = {'status': 'memout'}
+    except BaseException as e:
+        result = {'status': 'failed', 'error': str(e)}
+    result['time'] = timer.time() - start_time
+    try:
+        conn.send(result)
+    finally:
+        conn.close()
+
+
+def run_batch(files, solve, jobs=1, time_limit=None, memory_limit=None):
+    """Solve every file in its own worker process, at most jobs at a time.
+
+    files           - instance files, results are yielded in this order
+    solve           - picklable function that takes a file name and returns the sum of costs, None
+                      if the solver stopped at its own limits, or a dict with 'status' and any other
+                      fields, which becomes the result
+    time_limit      - wall-clock seconds per instance, the worker is killed after that
+    memory_limit    - address space limit of a worker in MB
+
+    Yields (file, result) pairs, result is a dict with 'status' (one of solved, failed, memout,
+    timeout, crashed or a status of a dict returned by solve), 'time' and, if solved, 'cost'. A result is yielded as soon as it and
+    all results of earlier files are known.
+    """
+
+    jobs = max(1, jobs)
+    results = [None] * len(files)
+    pending = list(range(len(files)))
+    pending.reverse()
+    running = dict()  # conn -> (index, process, start time)
+    next_to_yield = 0
+
+    while pending or running:
+        while pending and len(running) < jobs:
+            index = pending.pop()
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=run_worker,
+                                              args=(solve, files[index], memory_limit, sender))
+            process.start()
+            sender.close()
+            running[receiver] = (index, process, timer.time())
+
+        timeout = None
+        if time_limit is not None:
+            earliest = min(start for _, _, start in running.values())
+            timeout = max(0, earliest + time_limit - timer.time())
+
+        for conn in wait(list(running), timeout):
+            index, process, start = running.pop(conn)
+            try:
+                results[index] = conn.recv()
+            except EOFError:
+                # the worker died without reporting, e.g. killed when it ran out of memory
+                results[index] = {'status': 'crashed', 'time': timer.time() - start}
+            conn.close()
+            process.join()
+
+        if time_limit is not None:
+            now = timer.time()
+            for conn in [conn for conn, (_, _, start) in running.items() if now - start >= time_limit]:
+                index, process, start = running.pop(conn)
+                process.terminate()
+                process.join()
+                conn.close()
+                results[index] = {'status': 'timeout', 'time': now - start}
+
+        while next_to_yield < len(files) and results[next_to_yield] is not None:
+            yield files[next_to_yield], results[next_to_yield]
+            next_to_yield += 1
@@ -0,0 +1,265 @@
+#!/usr/bin/python
+"""Benchmark of the solvers over generated instance families and the files of instances/.
+
+Every (solver, instance) pair runs in its own worker process (see batch_runner.py) and
+reports its status, sum of costs, wall time, high-level and low-level expansions and peak
+RSS. The runs and a summary per solver, family, map size and number of agents, i.e. the
+scaling curves, are written to a JSON file. Given a baseline written by an earlier run,
+the runs are compared to it and the regressions are reported; the exit status is 1 if
+there are any.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --solvers CBS CBS-WDG --sizes 16 32 --agents 4 8 16 --baseline bench.json
+"""
+import argparse
+import glob
+import json
+import random
+import resource
+import sys
+import time as timer
+from functools import partial
+from statistics import mean
+from batch_runner import run_batch
+from instance_loader import intern_map, load_instance
+from instrumentation import Instrumentation
+from run_experiments import build_parser, find_paths
+from single_agent_planner import get_sum_of_cost
+
+# benchmarked configurations: name -> command line options of run_experiments.py
+SOLVERS = {
+    'Independent': {'solver': 'Independent'},
+    'Prioritized': {'solver': 'Prioritized'},
+    'CBS': {'solver': 'CBS'},
+    'CBS-first-conflict': {'solver': 'CBS', 'conflict_selection': 'first'},
+    'CBS-disjoint': {'solver': 'CBS', 'disjoint': True},
+    'CBS-WDG': {'solver': 'CBS', 'heuristic': 'WDG'},
+    'CBS-cat-bypass': {'solver': 'CBS', 'cat': True, 'bypass': True},
+    'ECBS': {'solver': 'ECBS', 'w': 1.1},
+    'LNS': {'solver': 'LNS', 'max_time': 1},
+}
+DEFAULT_SOLVERS = ('Independent', 'Prioritized', 'CBS', 'CBS-first-conflict', 'CBS-disjoint', 'CBS-WDG', 'CBS-cat-bypass',
+                   'ECBS')
+
+# generated families: name -> fraction of blocked cells
+FAMILIES = {
+    'empty': 0.0,
+    'random': 0.2,
+}
+
+# measurements compared to the baseline, a run regresses if one grows by more than the tolerance
+METRICS = ('wall_time', 'high_expanded', 'low_expanded', 'peak_rss_kb')
+
+
+def generate_instance(family, size, num_agents, seed):
+    """Return (my_map, starts, goals) of a size x size map of the family with random start and goal cells.
+
+    The starts, and the goals, are distinct cells of the largest connected area of the map,
+    so every agent can reach its goal.
+    """
+    rng = random.Random('{}-{}-{}-{}'.format(family, size, num_agents, seed))
+    blocked = bytearray(1 if rng.random() < FAMILIES[family] else 0 for _ in range(size * size))
+
+    # largest connected area by breadth-first search
+    area = []
+    seen = bytearray(blocked)
+    for cell in range(size * size):
+        if seen[cell]:
+            continue
+        seen[cell] = 1
+        component = [cell]
+        for curr in component:
+            x, y = divmod(curr, size)
+            for nx, ny in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+                if 0 <= nx < size and 0 <= ny < size and not seen[nx * size + ny]:
+                    seen[nx * size + ny] = 1
+                    component.append(nx * size + ny)
+        if len(component) > len(area):
+            area = component
+    if len(area) < num_agents:
+        raise BaseException('{} free cells for {} agents'.format(len(area), num_agents))
+
+    area.sort()
+    starts = [divmod(cell, size) for cell in rng.sample(area, num_agents)]
+    goals = [divmod(cell, size) for cell in rng.sample(area, num_agents)]
+    return intern_map(size, size, blocked), starts, goals
+
+
+def load_benchmark_instance(instance):
+    """Return (my_map, starts, goals) of an instance: ('file', name) or ('generated', family, size, agents, seed)."""
+    if instance[0] == 'file':
+        return load_instance(instance[1])
+    return generate_instance(*instance[1:])
+
+
+def run_benchmark(instance, options):
+    """Entry point of a worker: solve one instance and return its measurements, see batch_runner.run_batch."""
+    my_map, starts, goals = load_benchmark_instance(instance)
+    args = build_parser().parse_args([])
+    for name, value in options.items():
+        setattr(args, name, value)
+    instrumentation = Instrumentation()
+
+    start_time = timer.time()
+    paths = find_paths(my_map, starts, goals, args, instrumentation)
+    wall_time = timer.time() - start_time
+
+    return {'status': 'solved' if paths is not None else 'timeout',
+            'cost': get_sum_of_cost(paths) if paths is not None else None,
+            'wall_time': wall_time,
+            'high_expanded': instrumentation.counters['expanded'],
+            'high_generated': instrumentation.counters['generated'],
+            'low_searches': instrumentation.counters['low_level_searches'],
+            'low_expanded': instrumentation.counters['low_level_expanded'],
+            'low_generated': instrumentation.counters['low_level_generated'],
+            # on Linux in kilobytes, includes the memory the worker shares with the benchmark process
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def list_instances(args):
+    """Return (family, size, agents, instance) of every benchmarked instance."""
+    instances = []
+    for family in args.families:
+        for size in args.sizes:
+            for num_agents in args.agents:
+                for seed in range(args.seeds):
+                    instance = ('generated', family, size, num_agents, seed)
+                    if num_agents <= size * size // 2:
+                        instances.append((family, size, num_agents, instance))
+    for filename in args.files:
+        my_map, starts, goals = load_instance(filename)
+        instances.append(('instances', len(my_map), len(starts), ('file', filename)))
+    return instances
+
+
+def instance_name(instance):
+    if instance[0] == 'file':
+        return instance[1]
+    return '{}-{}x{}-{}-{}'.format(instance[1], instance[2], instance[2], instance[3], instance[4])
+
+
+def summarize(runs):
+    """Return the summary of the runs per solver, family, map size and number of agents."""
+    groups = dict()
+    for run in runs:
+        groups.setdefault((run['solver'], run['family'], run['size'], run['agents']), []).append(run)
+    summary = []
+    for (solver, family, size, agents), group in sorted(groups.items()):
+        solved = [run for run in group if run['status'] == 'solved']
+        row = {'solver': solver, 'family': family, 'size': size, 'agents': agents,
+               'runs': len(group), 'success_rate': len(solved) / len(group)}
+        for metric in METRICS:
+            values = [run[metric] for run in solved if run.get(metric) is not None]
+            row[metric] = mean(values) if values else None
+        summary.append(row)
+    return summary
+
+
+def compare(runs, baseline, tolerance, min_time):
+    """Return the regressions of runs against the runs of baseline, as printable lines.
+
+    A run regresses if it is not solved while it was solved in the baseline, if its sum of costs
+    grew, or if one of METRICS grew by more than the fraction tolerance (times by at least min_time).
+    """
+    old_runs = dict(((run['solver'], run['instance']), run) for run in baseline['runs'])
+    regressions = []
+    for run in runs:
+        old = old_runs.get((run['solver'], run['instance']))
+        if old is None or old['status'] != 'solved':
+            continue
+        name = '{} {}'.format(run['solver'], run['instance'])
+        if run['status'] != 'solved':
+            regressions.append('{}: {} (solved in the baseline)'.format(name, run['status']))
+            continue
+        if run['cost'] > old['cost']:
+            regressions.append('{}: sum of costs {} -> {}'.format(name, old['cost'], run['cost']))
+        for metric in METRICS:
+            if old.get(metric) is None or run.get(metric) is None:
+                continue
+            limit = old[metric] * (1 + tolerance)
+            if metric == 'wall_time':
+                limit = max(limit, old[metric] + min_time)
+            if run[metric] > limit:
+                regressions.append('{}: {} {} -> {}'.format(name, metric, round(old[metric], 3),
+                                                           round(run[metric], 3)))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the MAPF solvers')
+    parser.add_argument('--solvers', nargs='+', default=list(DEFAULT_SOLVERS), choices=sorted(SOLVERS),
+                        help='Solver configurations to run')
+    parser.add_argument('--families', nargs='+', default=sorted(FAMILIES), choices=sorted(FAMILIES),
+                        help='Generated instance families')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[8, 16, 32],
+                        help='Side lengths of the generated maps')
+    parser.add_argument('--agents', nargs='+', type=int, default=[2, 4, 8, 16],
+                        help='Numbers of agents of the generated instances')
+    parser.add_argument('--seeds', type=int, default=3,
+                        help='Generated instances per family, size and number of agents')
+    parser.add_argument('--files', nargs='*', default=None,
+                        help='Instance files to run as well, defaults to instances/*.txt')
+    parser.add_argument('--time-limit', type=float, default=10,
+                        help='Seconds per run, the solvers stop at it and the worker is killed at twice it')
+    parser.add_argument('--memory-limit', type=int, default=None,
+                        help='Memory limit in MB per run')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Runs at a time, more than one makes the times less comparable')
+    parser.add_argument('--output', type=str, default='benchmark.json',
+                        help='JSON file to write the runs and the summary to')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='JSON file of an earlier benchmark to compare to')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Fraction by which a measurement may grow before it counts as a regression')
+    parser.add_argument('--min-time', type=float, default=0.05,
+                        help='Seconds by which the wall time may grow in any case')
+    args = parser.parse_args()
+    if args.files is None:
+        args.files = sorted(glob.glob('instances/*.txt'))
+
+    instances = list_instances(args)
+    details = dict((instance, (family, size, agents)) for family, size, agents, instance in instances)
+    runs = []
+    for solver in args.solvers:
+        options = dict(SOLVERS[solver])
+        if options['solver'] in ('CBS', 'ECBS'):
+            options['max_time'] = args.time_limit
+        solve = partial(run_benchmark, options=options)
+        for instance, result in run_batch([instance for _, _, _, instance in instances], solve, args.jobs,
+                                          2 * args.time_limit, args.memory_limit):
+            family, size, agents = details[instance]
+            run = dict(result, solver=solver, instance=instance_name(instance),
+                       family=family, size=size, agents=agents)
+            runs.append(run)
+            print("{} {}: {} ({:.2f}s)".format(solver, run['instance'], run['status'], run['time']))
+
+    summary = summarize(runs)
+    print("\n{:<18} {:<10} {:>5} {:>6} {:>8} {:>10} {:>12} {:>12} {:>10}".format(
+        'solver', 'family', 'size', 'agents', 'success', 'time (s)', 'high exp', 'low exp', 'RSS (MB)'))
+    for row in summary:
+        print("{:<18} {:<10} {:>5} {:>6} {:>8.2f} {:>10} {:>12} {:>12} {:>10}".format(
+            row['solver'], row['family'], row['size'], row['agents'], row['success_rate'],
+            '-' if row['wall_time'] is None else '{:.3f}'.format(row['wall_time']),
+            '-' if row['high_expanded'] is None else '{:.0f}'.format(row['high_expanded']),
+            '-' if row['low_expanded'] is None else '{:.0f}'.format(row['low_expanded']),
+            '-' if row['peak_rss_kb'] is None else '{:.1f}'.format(row['peak_rss_kb'] / 1024)))
+
+    with open(args.output, 'w') as f:
+        json.dump({'solvers': dict((solver, SOLVERS[solver]) for solver in args.solvers),
+                   'time_limit': args.time_limit,
+                   'runs': runs,
+                   'summary': summary}, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(runs, baseline, args.tolerance, args.min_time)
+        print("\n{} regressions against {}".format(len(regressions), args.baseline))
+        for regression in regressions:
+            print(regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
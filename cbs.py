@@ -1,13 +1,23 @@
 import time as timer
 import heapq
 import random
-from single_agent_planner import compute_heuristics, a_star, get_location, get_sum_of_cost
+from collections import OrderedDict
+from map_context import as_context
+from reservation_table import ReservationTable, find_collisions
+from solver_result import SolverResult
+from instrumentation import NULL_INSTRUMENTATION
+from mdd import MDDCache, is_cardinal
+from replan_pool import ReplanPool
+import cbs_heuristics
+from single_agent_planner import NodeLimitReached, constraint_key, constraint_set_key, get_location, get_planner, \
+    get_sum_of_cost
 
 def is_equal_constraint(constraint1, constraint2):
     """Check if two constraints are equal."""
     return (constraint1['agent'] == constraint2['agent'] and
             constraint1['loc'] == constraint2['loc'] and
-            constraint1['timestep'] == constraint2['timestep'])
+            constraint1['timestep'] == constraint2['timestep'] and
+            constraint1.get('positive', False) == constraint2.get('positive', False))
 
 def add_unique_constraint(constraints, new_constraint):
     """Add a new constraint to the list if it is unique."""
@@ -71,6 +81,22 @@ def detect_collisions(paths):
     return collisions
 
 
+def update_collisions(collisions, reservations, agent, path):
+    """Return the collisions after the path of agent changed to path.
+
+    collisions      - collisions of the paths before the change, as returned by detect_collisions
+    reservations    - ReservationTable holding the paths of the other agents
+    Only the pairs that involve agent are checked again, the other collisions are inherited.
+    """
+
+    updated = [collision for collision in collisions if collision['a1'] != agent and collision['a2'] != agent]
+    updated.extend(reservations.find_conflicts(agent, path).values())
+
+    # keep the pair order of detect_collisions
+    updated.sort(key=lambda collision: (collision['a1'], collision['a2']))
+    return updated
+
+
 def standard_splitting(collision):
     ##############################
     # Task 3.2: Return a list of (two) constraints to resolve the given collision
@@ -106,75 +132,209 @@ def disjoint_splitting(collision):
     #                          specified edge at the specified timestep
     #           Choose the agent randomly
 
-    pass
+    if random.randint(0, 1) == 0:
+        agent = collision['a1']
+        loc = collision['loc']
+    else:
+        agent = collision['a2']
+        # edges are given in the direction a1 moves
+        loc = list(reversed(collision['loc']))
+
+    return [{'agent': agent, 'loc': loc, 'timestep': collision['timestep'], 'positive': True},
+            {'agent': agent, 'loc': loc, 'timestep': collision['timestep'], 'positive': False}]
+
+
+def paths_violate_constraint(constraint, paths):
+    """Return the agents other than constraint['agent'] whose paths collide with the positive constraint."""
+    timestep = constraint['timestep']
+    loc = constraint['loc']
+    violating = []
+    for i in range(len(paths)):
+        if i == constraint['agent']:
+            continue
+        curr = get_location(paths[i], timestep)
+        # vertex constraint
+        if len(loc) == 1:
+            if curr == loc[0]:
+                violating.append(i)
+        # edge constraint: the agent is at either end of the move or moves in the other direction
+        else:
+            prev = get_location(paths[i], timestep - 1)
+            if prev == loc[0] or curr == loc[1] or (prev == loc[1] and curr == loc[0]):
+                violating.append(i)
+    return violating
+
+
+# node constraint hashes are sums of constraint hashes modulo 2 ** 64
+HASH_MASK = (1 << 64) - 1
+
+
+def constraint_hash(constraint):
+    """Return the hash of a constraint that is added to the hash of the constraint set of a node."""
+    return hash(constraint_key(constraint)) & HASH_MASK
+
+
+class PathCache(object):
+    """LRU cache of low-level paths keyed by (agent, constraints of the agent).
+
+    A path only depends on the constraints of its agent, so the agents that are replanned
+    under the same constraints in different branches of the constraint tree, or by the
+    pairwise searches of the WDG heuristic, search only once. Paths planned with conflict
+    avoidance also depend on the other paths and are not cached.
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.paths = OrderedDict()
+
+    def key(self, agent, constraints):
+        return agent, constraint_set_key(constraints, agent)
+
+    def __contains__(self, key):
+        return key in self.paths
+
+    def get(self, key):
+        self.paths.move_to_end(key)
+        return self.paths[key]
+
+    def put(self, key, path):
+        self.paths[key] = path
+        while len(self.paths) > self.capacity:
+            self.paths.popitem(last=False)
 
 
 class CBSSolver(object):
     """The high-level search of CBS."""
 
-    def __init__(self, my_map, starts, goals):
-        """my_map   - list of lists specifying obstacle positions
+    def __init__(self, my_map, starts, goals, instrumentation=None, prioritize_conflicts=True, heuristic=None,
+                 conflict_avoidance=False, bypass=False, low_level='a_star', jobs=1, top_k=1, node_limit=None):
+        """my_map   - list of lists specifying obstacle positions, or a MapContext of them
         starts      - [(x1, y1), (x2, y2), ...] list of start locations
         goals       - [(x1, y1), (x2, y2), ...] list of goal locations
+        instrumentation - Instrumentation collecting counters, timers and a trace, off by default
+        prioritize_conflicts - split on cardinal, then semi-cardinal collisions first (uses MDDs)
+        heuristic   - admissible high-level heuristic: None, 'CG', 'DG', 'WDG' or a function h(solver, node),
+                      see cbs_heuristics.py. Nodes are expanded in order of cost + h
+        conflict_avoidance - low-level searches prefer the paths with fewer collisions with the other agents
+        bypass      - when a child has the cost and fewer collisions than its parent, adopt its paths in the
+                      parent instead of branching
+        low_level   - low-level planner, 'a_star' or 'sipp'
+        jobs        - number of worker processes that replan the children of the expanded nodes, 1 to replan them
+                      in this process
+        top_k       - number of best open nodes expanded together, whose children are replanned at once
+        node_limit  - nodes a low-level search may store, the search stops as if timed out when one stores more
         """
 
-        self.my_map = my_map
-        self.starts = starts
-        self.goals = goals
+        self.context = as_context(my_map)
+        self.my_map = self.context.my_map
+        self.grid = self.context.grid
+        # the search works on integer cell ids, see grid.py
+        self.starts = self.grid.cells(starts)
+        self.goals = self.grid.cells(goals)
         self.num_of_agents = len(goals)
 
         self.num_of_generated = 0
         self.num_of_expanded = 0
         self.CPU_time = 0
+        self.node_limit = node_limit
+        self.result = None
+        self.instrumentation = instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
 
         self.open_list = []
+        # paths of the node being expanded, used to check the paths of its children
+        self.reservations = ReservationTable()
 
         # compute heuristics for the low-level search
-        self.heuristics = []
-        for goal in self.goals:
-            self.heuristics.append(compute_heuristics(my_map, goal))
+        self.heuristics = self.context.heuristics(self.goals)
+
+        self.prioritize_conflicts = prioritize_conflicts
+        self.mdds = MDDCache(self.grid, self.starts, self.goals, self.heuristics)
+        self.high_level_heuristic = cbs_heuristics.get_heuristic(heuristic)
+        self.conflict_avoidance = conflict_avoidance
+        self.bypass = bypass
+        self.low_level = get_planner(low_level)
+        self.low_level_name = low_level
+        self.jobs = jobs
+        self.top_k = top_k
+        self.pool = None
+        self.path_cache = PathCache()
+        # constraint hash -> record of the generated node, see add_transposition
+        self.transpositions = dict()
 
     def push_node(self, node):
-        heapq.heappush(self.open_list, (node['cost'], len(node['collisions']), self.num_of_generated, node))
-        print("Generate node {}".format(self.num_of_generated))
+        node['h'] = 0
+        if self.high_level_heuristic is not None and node['collisions']:
+            with self.instrumentation.timer('heuristic'):
+                node['h'] = self.high_level_heuristic(self, node)
+        heapq.heappush(self.open_list, (node['cost'] + node['h'], len(node['collisions']), self.num_of_generated, node))
+        if self.instrumentation.tracing:
+            self.instrumentation.trace('generate', id=self.num_of_generated, cost=node['cost'], h=node['h'],
+                                       collisions=len(node['collisions']), constraints=node['depth'])
         self.num_of_generated += 1
 
     def pop_node(self):
         _, _, id, node = heapq.heappop(self.open_list)
-        print("Expand node {}".format(id))
-        # if id > 8:
-        #     print("No solution found")
-        #     return None
+        if self.instrumentation.tracing:
+            self.instrumentation.trace('expand', id=id, cost=node['cost'],
+                                       collisions=len(node['collisions']), constraints=node['depth'])
         self.num_of_expanded += 1
         return node
 
-    def find_solution(self, disjoint=True):
+    def find_solution(self, disjoint=True, max_time=None, max_expansions=None):
         """ Finds paths for all agents from their start locations to their goal locations
 
-        disjoint    - use disjoint splitting or not
+        disjoint        - use disjoint splitting or not
+        max_time        - stop after this many seconds
+        max_expansions  - stop after expanding this many nodes
+        Returns the paths, or None if a limit stopped the search. The statistics are kept in self.result.
         """
 
+        if self.jobs > 1:
+            self.pool = ReplanPool(self.jobs, self.grid, self.starts, self.goals, self.heuristics,
+                                   self.low_level_name, self.node_limit)
+        try:
+            return self.search(disjoint, max_time, max_expansions)
+        except NodeLimitReached:
+            # the low-level search gave up, so it is unknown whether the node has a path
+            self.set_result(None, timed_out=True)
+            return None
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool = None
+
+    def search(self, disjoint, max_time, max_expansions):
         self.start_time = timer.time()
+        self.result = SolverResult()
 
         # Generate the root node
         # constraints   - list of constraints
         # paths         - list of paths, one for each agent
         #               [[(x11, y11), (x12, y12), ...], [(x21, y21), (x22, y22), ...], ...]
         # collisions     - list of collisions in paths
-        root = {'cost': 0,
-                'constraints': [],
-                'paths': [],
-                'collisions': []}
+        root = self.root_node()
+        instrumentation = self.instrumentation
+        self.reservations.set_paths([])
+        if self.pool is not None and not self.conflict_avoidance:
+            # the initial paths do not depend on each other, the workers plan them at once
+            root['paths'] = self.replan_in_pool([(i, [], None) for i in range(self.num_of_agents)])
+            if None in root['paths']:
+                raise BaseException('No solutions')
         for i in range(self.num_of_agents):  # Find initial path for each agent
-            path = a_star(self.my_map, self.starts[i], self.goals[i], self.heuristics[i],
-                          i, root['constraints'])
-            if path is None:
+            if root['paths'][i] is not None:
+                continue
+            if not self.replan_agents(root, [i]):
                 raise BaseException('No solutions')
-            root['paths'].append(path)
+            if self.conflict_avoidance:
+                self.reservations.add_path(i, root['paths'][i])
+        root['record'] = (None, None, tuple(enumerate(root['paths'])))
 
         root['cost'] = get_sum_of_cost(root['paths'])
-        root['collisions'] = detect_collisions(root['paths'])
+        with instrumentation.timer('collisions'):
+            root['collisions'] = find_collisions(root['paths'])
+        self.add_transposition(root)
         self.push_node(root)
+        self.release_node(root)
 
         # Task 3.1: Testing
         # print(root['collisions'])
@@ -193,52 +353,317 @@ class CBSSolver(object):
         #           Ensure to create a copy of any objects that your child nodes might inherit
 
         while len(self.open_list) > 0:
-            curr = self.pop_node()
-
-            print(len(curr['constraints']))
-            print(curr['paths'])
-            print('Cost: ' + str(curr['cost']))
-            print(curr['collisions'])
-            print(curr['constraints'])
-
-            if not curr['collisions']:
-                return curr['paths'] # curr is a goal node
-
-            collision = curr['collisions'][0]
-            constraints = standard_splitting(collision)
-            #
-            print('generated constraints' + str(constraints))
-
-            print('=====================')
-
-            for constraint in constraints:
-                new_constraints = curr['constraints'].copy()
-                new_constraints = add_unique_constraint(new_constraints, constraint)
-                child = {'cost': 0,
-                         'constraints': new_constraints,
-                         'paths': curr['paths'].copy(),
-                         'collisions': []}
-
-                agent = constraint['agent']
-                path = a_star(self.my_map, self.starts[agent], self.goals[agent], self.heuristics[agent],
-                              agent, child['constraints'])
-
-                if path:
+            if (max_time is not None and timer.time() - self.start_time >= max_time) or \
+               (max_expansions is not None and self.num_of_expanded >= max_expansions):
+                self.set_result(None, timed_out=True)
+                return None
+
+            # the top_k best nodes are expanded together, so the workers replan the children of all of
+            # them at once. A goal node is only taken from the top of the open list, so the solution
+            # stays optimal, and the search is the same in every run
+            batch = []
+            while len(self.open_list) > 0 and len(batch) < self.top_k and \
+                    (not batch or self.open_list[0][-1]['collisions']) and \
+                    (max_expansions is None or self.num_of_expanded < max_expansions):
+                curr = self.pop_node()
+                curr['paths'] = self.node_paths(curr)
+
+                if not curr['collisions']:
+                    # curr is a goal node
+                    self.set_result([self.grid.locs(path) for path in curr['paths']])
+                    return self.result.paths
+
+                with instrumentation.timer('mdd'):
+                    collision = self.choose_collision(curr)
+                with instrumentation.timer('splitting'):
+                    if disjoint:
+                        constraints = disjoint_splitting(collision)
+                    else:
+                        constraints = standard_splitting(collision)
+
+                children = []
+                for constraint in constraints:
+                    child = self.child_node(curr, constraint)
+                    if self.is_duplicate(child):
+                        # another branch already generated a node with the same constraints
+                        instrumentation.count('duplicates')
+                        continue
+
+                    # Task 4.3: the path of the agent of a positive constraint already meets it, instead
+                    #           the other agents whose paths collide with the constraint are replanned
+                    if constraint.get('positive', False):
+                        agents = paths_violate_constraint(constraint, child['paths'])
+                    else:
+                        agents = [constraint['agent']]
+                    children.append((child, agents))
+                batch.append((curr, children))
+
+            for (curr, children), replanned in zip(batch, self.replan_children(batch)):
+                self.generate_children(curr, children, replanned)
+
+        self.set_result(None)
+        raise BaseException('No solutions')
+
+    def replan_children(self, batch):
+        """Replan the agents of the children of every (node, [(child, agents), ...]) in batch.
+
+        Returns, for every node, whether each of its children got paths for all its agents.
+        """
+        if self.pool is None:
+            replanned = []
+            for curr, children in batch:
+                # the conflict avoidance table holds the paths of the parent
+                with self.instrumentation.timer('collisions'):
+                    self.reservations.set_paths(curr['paths'])
+                replanned.append([self.replan_agents(child, agents) for child, agents in children])
+            return replanned
+
+        # the agents of a child are planned under the same constraints, so they are independent tasks as well
+        # only the agents without a cached path are sent to the workers
+        tasks = []
+        lookups = []    # (cache key or None, cached or not, cached path) of every agent, in the order of the batch
+        for curr, children in batch:
+            cat_paths = curr['paths'] if self.conflict_avoidance else None
+            for child, agents in children:
+                for agent in agents:
+                    constraints = self.agent_constraints(child, agent)
+                    key = self.path_cache.key(agent, constraints) if cat_paths is None else None
+                    if key is not None and key in self.path_cache:
+                        self.instrumentation.count('low_level_cache_hits')
+                        lookups.append((None, True, self.path_cache.get(key)))
+                    else:
+                        lookups.append((key, False, None))
+                        tasks.append((agent, constraints, cat_paths))
+        paths = iter(self.replan_in_pool(tasks))
+        lookups = iter(lookups)
+        replanned = []
+        for curr, children in batch:
+            replanned.append([])
+            for child, agents in children:
+                for agent in agents:
+                    key, cached, path = next(lookups)
+                    if not cached:
+                        path = next(paths)
+                        if key is not None:
+                            self.path_cache.put(key, path)
                     child['paths'][agent] = path
-                    child['collisions'] = detect_collisions(child['paths'])
-                    child['cost'] = get_sum_of_cost(child['paths'])
-
-                    self.push_node(child)
-                else:
-                    raise BaseException('No solutions')
-
+                replanned[-1].append(all(child['paths'][agent] is not None for agent in agents))
+        return replanned
+
+    def replan_in_pool(self, tasks):
+        with self.instrumentation.timer('low_level'):
+            paths = self.pool.replan(tasks, self.instrumentation)
+        self.instrumentation.count('low_level_calls', len(tasks))
+        return paths
+
+    def generate_children(self, curr, children, replanned):
+        """Push the replanned children of curr, or curr itself again if it bypasses them."""
+        instrumentation = self.instrumentation
+        with instrumentation.timer('collisions'):
+            self.reservations.set_paths(curr['paths'])
+
+        generated = []
+        for (child, agents), succeeded in zip(children, replanned):
+            if not succeeded:
+                # a child without a path has no solution and is not generated
+                instrumentation.count('low_level_failures')
+                continue
+
+            with instrumentation.timer('collisions'):
+                child['collisions'] = curr['collisions']
+                for agent in agents:
+                    child['collisions'] = update_collisions(child['collisions'], self.reservations,
+                                                            agent, child['paths'][agent])
+                    self.reservations.add_path(agent, child['paths'][agent])
+                # back to the paths of curr for the next child
+                self.reservations.set_paths(curr['paths'])
+            parent, constraint, _ = child['record']
+            child['record'] = (parent, constraint, tuple((agent, child['paths'][agent]) for agent in agents))
+            child['cost'] = get_sum_of_cost(child['paths'])
+            generated.append(child)
+
+        if self.bypass:
+            for child in generated:
+                if child['cost'] == curr['cost'] and len(child['collisions']) < len(curr['collisions']):
+                    # the paths of the child also satisfy the constraints of curr, so curr takes them
+                    # over and goes back to the open list instead of being split
+                    instrumentation.count('bypasses')
+                    curr['paths'] = child['paths']
+                    parent, constraint, changed = curr['record']
+                    curr['record'] = (parent, constraint, child['record'][2] + changed)
+                    curr['collisions'] = child['collisions']
+                    generated = [curr]
+                    break
+
+        for child in generated:
+            if child is not curr and not self.add_transposition(child):
+                # a node with the same constraints was generated by another node of the batch
+                instrumentation.count('duplicates')
+                continue
+            self.push_node(child)
+            self.release_node(child)
+        self.release_node(curr)
+
+    # A node only stores its own constraint and the paths it changed, in its record (parent record,
+    # constraint, ((agent, path), ...)). The records form the constraint tree, the constraints and paths
+    # of all agents are collected from them when needed. 'paths' only holds all paths while the node
+    # is generated or expanded, and an expanded node is dropped as soon as its children are generated.
+
+    def root_node(self):
+        return {'cost': 0,
+                'record': (None, None, ()),
+                'depth': 0,
+                'constraint_hash': 0,
+                'paths': [None] * self.num_of_agents,
+                'collisions': []}
 
-        # if self.num_of_generated > 8:
-        #     print("No solution found")
-        #     return None
-        # self.print_results(root)
-        # return root['paths']
+    def child_node(self, node, constraint):
+        """Return a child of node with the added constraint. The paths still have to be replanned."""
+        return {'cost': 0,
+                'record': (node['record'], constraint, ()),
+                'depth': node['depth'] + 1,
+                'constraint_hash': (node['constraint_hash'] + constraint_hash(constraint)) & HASH_MASK,
+                'paths': node['paths'].copy(),
+                'collisions': []}
 
+    def release_node(self, node):
+        """Drop what a node in the open list can collect from the constraint tree again."""
+        node.pop('paths', None)
+        node.pop('agent_constraints', None)
+        node.pop('agent_constraint_hashes', None)
+
+    def node_paths(self, node):
+        """Return the paths of all agents in node, the latest ones the records of its ancestors hold."""
+        paths = [None] * self.num_of_agents
+        missing = self.num_of_agents
+        record = node['record']
+        while missing > 0:
+            parent, _, changed = record
+            for agent, path in changed:
+                if paths[agent] is None:
+                    paths[agent] = path
+                    missing -= 1
+            record = parent
+        return paths
+
+    def constraint_set(self, record):
+        """Return the keys of the constraints of the node of record, see constraint_key."""
+        constraints = set()
+        while record is not None:
+            record, constraint, _ = record
+            if constraint is not None:
+                constraints.add(constraint_key(constraint))
+        return constraints
+
+    def is_duplicate(self, node):
+        """Return True if a node with the same constraints as node was generated before.
+
+        Such a node has the same paths costs and the same solutions below it, so the search
+        can drop node. The constraint hash of node finds the candidate, whose constraints are
+        compared to the ones of node to rule out a hash collision.
+        """
+        other = self.transpositions.get(node['constraint_hash'])
+        return other is not None and self.constraint_set(other) == self.constraint_set(node['record'])
+
+    def add_transposition(self, node):
+        """Add a generated node to the transposition table. Return False if it is a duplicate."""
+        if self.is_duplicate(node):
+            return False
+        self.transpositions.setdefault(node['constraint_hash'], node['record'])
+        return True
+
+    def agent_constraints(self, node, agent):
+        """Return the constraints of node that affect agent (see build_constraint_table), cached in the node."""
+        cache = node.get('agent_constraints')
+        if cache is None:
+            cache = node['agent_constraints'] = dict()
+        if agent not in cache:
+            constraints = []
+            record = node['record']
+            while record is not None:
+                record, constraint, _ = record
+                if constraint is not None and (constraint['agent'] == agent or constraint.get('positive', False)):
+                    constraints.append(constraint)
+            constraints.reverse()
+            cache[agent] = constraints
+        return cache[agent]
+
+    def agent_constraint_hash(self, node, agent):
+        """Return the hash of agent_constraints(node, agent), see constraint_hash, cached in the node."""
+        cache = node.get('agent_constraint_hashes')
+        if cache is None:
+            cache = node['agent_constraint_hashes'] = dict()
+        if agent not in cache:
+            cache[agent] = sum(constraint_hash(constraint)
+                               for constraint in self.agent_constraints(node, agent)) & HASH_MASK
+        return cache[agent]
+
+    def choose_collision(self, node):
+        """Return the first cardinal collision of node, else the first semi-cardinal one, else the first one."""
+        if not self.prioritize_conflicts:
+            return node['collisions'][0]
+        semi_cardinal = None
+        for collision in node['collisions']:
+            cardinality = self.classify_collision(node, collision)
+            if cardinality == 2:
+                self.instrumentation.count('cardinal')
+                return collision
+            if cardinality == 1 and semi_cardinal is None:
+                semi_cardinal = collision
+        if semi_cardinal is not None:
+            self.instrumentation.count('semi_cardinal')
+            return semi_cardinal
+        self.instrumentation.count('non_cardinal')
+        return node['collisions'][0]
+
+    def classify_collision(self, node, collision):
+        """Return the number of agents of collision (0, 1 or 2) that cannot avoid it without a longer path."""
+        cardinality = 0
+        for agent in (collision['a1'], collision['a2']):
+            path = node['paths'][agent]
+            mdd = self.mdds.get(agent, len(path) - 1, self.agent_constraints(node, agent))
+            if mdd is not None and is_cardinal(mdd, collision):
+                cardinality += 1
+        return cardinality
+
+    def replan(self, agent, constraints, cat=None):
+        key = None
+        if cat is None:
+            key = self.path_cache.key(agent, constraints)
+            if key in self.path_cache:
+                self.instrumentation.count('low_level_cache_hits')
+                return self.path_cache.get(key)
+        with self.instrumentation.timer('low_level'):
+            path = self.low_level(self.grid, self.starts[agent], self.goals[agent], self.heuristics[agent],
+                                  agent, constraints, self.node_limit, cat=cat, instrumentation=self.instrumentation)
+        self.instrumentation.count('low_level_calls')
+        if key is not None:
+            self.path_cache.put(key, path)
+        return path
+
+    def conflict_avoidance_table(self):
+        """Return the table of paths the low-level searches avoid collisions with, or None."""
+        return self.reservations if self.conflict_avoidance else None
+
+    def replan_agents(self, node, agents):
+        """Replan the paths of agents in node under its constraints. Return False if one of them has no path."""
+        for agent in agents:
+            path = self.replan(agent, self.agent_constraints(node, agent), self.conflict_avoidance_table())
+            if path is None:
+                return False
+            node['paths'][agent] = path
+        return True
+
+    def set_result(self, paths, timed_out=False):
+        self.CPU_time = timer.time() - self.start_time
+        self.instrumentation.count('expanded', self.num_of_expanded)
+        self.instrumentation.count('generated', self.num_of_generated)
+        self.result = SolverResult(paths=paths,
+                                   sum_of_costs=get_sum_of_cost(paths) if paths is not None else None,
+                                   expanded=self.num_of_expanded,
+                                   generated=self.num_of_generated,
+                                   CPU_time=self.CPU_time,
+                                   timed_out=timed_out)
 
     def print_results(self, node):
         print("\n Found a solution! \n")
@@ -0,0 +1,270 @@
+import heapq
+from collections import OrderedDict
+import cbs
+from single_agent_planner import get_sum_of_cost
+
+
+def min_vertex_cover(edges, bound=None):
+    """Return the size of a minimum vertex cover of the graph given by a list of (u, v) edges.
+
+    Exact branch and bound: the vertex of highest degree is either in the cover, or all of its
+    neighbors are. Returns a value >= bound if the cover needs at least bound vertices.
+    """
+    if not edges:
+        return 0
+    if bound is None:
+        bound = len(edges) + 1
+    if bound <= 0:
+        return bound
+
+    neighbors = dict()
+    for u, v in edges:
+        neighbors.setdefault(u, set()).add(v)
+        neighbors.setdefault(v, set()).add(u)
+    vertex = max(neighbors, key=lambda x: (len(neighbors[x]), x))
+
+    # vertex in the cover
+    rest = [(u, v) for u, v in edges if u != vertex and v != vertex]
+    best = 1 + min_vertex_cover(rest, bound - 1)
+
+    # all neighbors of vertex in the cover
+    cover = neighbors[vertex]
+    if len(cover) < min(best, bound):
+        rest = [(u, v) for u, v in edges if u not in cover and v not in cover]
+        best = min(best, len(cover) + min_vertex_cover(rest, min(best, bound) - len(cover)))
+    return best
+
+
+def min_weighted_vertex_cover(weights):
+    """Return the minimum sum of non-negative integers x_v with x_u + x_v >= w for every edge.
+
+    weights     - {(u, v): w} edge weights
+    """
+    total = 0
+    for component in connected_components(weights):
+        if len(component) > 16:
+            # too large for the exact search, any matching gives a lower bound
+            total += greedy_matching_weight(component)
+        else:
+            total += weighted_cover_search(component)
+    return total
+
+
+def connected_components(weights):
+    neighbors = dict()
+    for (u, v), w in weights.items():
+        neighbors.setdefault(u, dict())[v] = w
+        neighbors.setdefault(v, dict())[u] = w
+    components = []
+    seen = set()
+    for start in sorted(neighbors):
+        if start in seen:
+            continue
+        seen.add(start)
+        component = {start: neighbors[start]}
+        stack = [start]
+        while stack:
+            for other in neighbors[stack.pop()]:
+                if other not in seen:
+                    seen.add(other)
+                    component[other] = neighbors[other]
+                    stack.append(other)
+        components.append(component)
+    return components
+
+
+def greedy_matching_weight(component):
+    total = 0
+    matched = set()
+    edges = sorted(((w, u, v) for u in component for v, w in component[u].items() if u < v), reverse=True)
+    for w, u, v in edges:
+        if u not in matched and v not in matched:
+            matched.add(u)
+            matched.add(v)
+            total += w
+    return total
+
+
+def weighted_cover_search(component):
+    vertices = sorted(component, key=lambda x: -len(component[x]))
+    values = dict()
+    best = [sum(max(component[v].values()) for v in vertices)]
+
+    def search(i, total):
+        if total >= best[0]:
+            return
+        if i == len(vertices):
+            best[0] = total
+            return
+        vertex = vertices[i]
+        lowest = 0
+        for other, w in component[vertex].items():
+            if other in values:
+                lowest = max(lowest, w - values[other])
+        for value in range(lowest, max(component[vertex].values()) + 1):
+            values[vertex] = value
+            search(i + 1, total + value)
+        del values[vertex]
+
+    search(0, 0)
+    return best[0]
+
+
+def has_joint_path(mdd1, mdd2):
+    """Return True if the two MDDs contain a pair of paths that do not collide."""
+    length = max(len(mdd1), len(mdd2))
+
+    def children(mdd, t, loc):
+        # after its last level the agent waits at its goal
+        if t + 1 >= len(mdd):
+            return (loc,)
+        return mdd[t][loc]
+
+    start1 = next(iter(mdd1[0]))
+    start2 = next(iter(mdd2[0]))
+    if start1 == start2:
+        return False
+    level = {(start1, start2)}
+    for t in range(length - 1):
+        next_level = set()
+        for loc1, loc2 in level:
+            for next1 in children(mdd1, t, loc1):
+                for next2 in children(mdd2, t, loc2):
+                    # vertex and edge collisions
+                    if next1 != next2 and not (next1 == loc2 and next2 == loc1):
+                        next_level.add((next1, next2))
+        if not next_level:
+            return False
+        level = next_level
+    return True
+
+
+class ConflictGraphHeuristic(object):
+    """CG: minimum vertex cover of the graph of agents with cardinal collisions."""
+
+    def __call__(self, solver, node):
+        edges = set()
+        for collision in node['collisions']:
+            if solver.classify_collision(node, collision) == 2:
+                edges.add((collision['a1'], collision['a2']))
+        return min_vertex_cover(sorted(edges))
+
+
+class DependencyGraphHeuristic(object):
+    """DG: minimum vertex cover of the graph of agents that cannot both keep their costs.
+
+    Whether two agents are dependent only depends on their costs and constraints, so the answers
+    are kept in an LRU cache keyed by pair_key and reused by the other nodes.
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.dependencies = OrderedDict()
+
+    def __call__(self, solver, node):
+        edges = [pair for pair, weight in self.pair_weights(solver, node).items() if weight > 0]
+        return min_vertex_cover(sorted(edges))
+
+    def pair_weights(self, solver, node):
+        weights = dict()
+        for collision in node['collisions']:
+            pair = (collision['a1'], collision['a2'])
+            if pair in weights:
+                continue
+            if solver.classify_collision(node, collision) == 2:
+                weights[pair] = 1
+            else:
+                weights[pair] = 1 if self.is_dependent(solver, node, *pair) else 0
+        return weights
+
+    def pair_key(self, solver, node, a1, a2):
+        # the constraints of each agent by their hash, a few integers instead of the constraints themselves
+        return (a1, a2, len(node['paths'][a1]), len(node['paths'][a2]),
+                solver.agent_constraint_hash(node, a1), solver.agent_constraint_hash(node, a2))
+
+    def cached(self, cache, key, compute):
+        """Return cache[key], calling compute() on a miss. The cache keeps the capacity most recent keys."""
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        value = cache[key] = compute()
+        while len(cache) > self.capacity:
+            cache.popitem(last=False)
+        return value
+
+    def is_dependent(self, solver, node, a1, a2):
+        return self.cached(self.dependencies, self.pair_key(solver, node, a1, a2),
+                           lambda: self.mdds_dependent(solver, node, a1, a2))
+
+    def mdds_dependent(self, solver, node, a1, a2):
+        mdd1 = solver.mdds.get(a1, len(node['paths'][a1]) - 1, solver.agent_constraints(node, a1))
+        mdd2 = solver.mdds.get(a2, len(node['paths'][a2]) - 1, solver.agent_constraints(node, a2))
+        return mdd1 is None or mdd2 is None or not has_joint_path(mdd1, mdd2)
+
+
+class WeightedDependencyGraphHeuristic(DependencyGraphHeuristic):
+    """WDG: minimum weighted vertex cover, weighted by the extra cost two dependent agents need."""
+
+    def __init__(self, max_expansions=100, capacity=10000):
+        DependencyGraphHeuristic.__init__(self, capacity)
+        self.max_expansions = max_expansions
+        self.weights = OrderedDict()
+
+    def __call__(self, solver, node):
+        weights = dict()
+        for pair, weight in self.pair_weights(solver, node).items():
+            if weight > 0:
+                weights[pair] = self.pair_weight(solver, node, *pair)
+        return min_weighted_vertex_cover(weights)
+
+    def pair_weight(self, solver, node, a1, a2):
+        return self.cached(self.weights, self.pair_key(solver, node, a1, a2),
+                           lambda: self.solve_pair(solver, node, a1, a2))
+
+    def solve_pair(self, solver, node, a1, a2):
+        """Run CBS on the two agents under the constraints of node, return the increase of their sum of costs."""
+        base = len(node['paths'][a1]) + len(node['paths'][a2]) - 2
+        open_list = []
+        constraints = solver.agent_constraints(node, a1) + solver.agent_constraints(node, a2)
+        root = {'constraints': constraints, 'paths': {a1: node['paths'][a1], a2: node['paths'][a2]}}
+        heapq.heappush(open_list, (base, 0, root))
+        generated = 1
+        expanded = 0
+        while open_list:
+            cost, _, curr = heapq.heappop(open_list)
+            collision = cbs.detect_collision(curr['paths'][a1], curr['paths'][a2])
+            if collision is None:
+                return cost - base
+            if expanded >= self.max_expansions:
+                # the cost of the best open node is still a lower bound, and the agents are dependent
+                return max(1, cost - base)
+            expanded += 1
+            collision['a1'] = a1
+            collision['a2'] = a2
+            for constraint in cbs.standard_splitting(collision):
+                constraints = curr['constraints'] + [constraint]
+                agent = constraint['agent']
+                path = solver.replan(agent, constraints)
+                if path is None:
+                    continue
+                paths = dict(curr['paths'])
+                paths[agent] = path
+                heapq.heappush(open_list, (get_sum_of_cost(paths.values()), generated,
+                                           {'constraints': constraints, 'paths': paths}))
+                generated += 1
+        # the two agents cannot both reach their goals, no bound better than dependent
+        return 1
+
+
+HEURISTICS = {'CG': ConflictGraphHeuristic,
+              'DG': DependencyGraphHeuristic,
+              'WDG': WeightedDependencyGraphHeuristic}
+
+
+def get_heuristic(heuristic):
+    """Return a high-level heuristic: None, a name in HEURISTICS or a callable h(solver, node)."""
+    if heuristic is None or callable(heuristic):
+        return heuristic
+    if heuristic not in HEURISTICS:
+        raise RuntimeError("Unknown high-level heuristic: {}".format(heuristic))
+    return HEURISTICS[heuristic]()
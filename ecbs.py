@@ -0,0 +1,79 @@
+from cbs import CBSSolver
+from focal_list import FocalList
+from single_agent_planner import focal_a_star
+
+
+class ECBSSolver(CBSSolver):
+    """Enhanced CBS, a bounded-suboptimal CBS with focal search at both levels.
+
+    The low-level searches return paths at most w times longer than the shortest ones and
+    prefer the paths with fewer collisions with the other agents. The high-level search
+    expands, among the nodes with a sum of costs of at most w times the smallest lower bound
+    of the open nodes, the one with the fewest collisions. The sum of costs of the solution is
+    at most w times the optimal sum of costs.
+    """
+
+    def __init__(self, my_map, starts, goals, instrumentation=None, w=1.1, bypass=False, node_limit=None):
+        """my_map   - list of lists specifying obstacle positions, or a MapContext of them
+        starts      - [(x1, y1), (x2, y2), ...] list of start locations
+        goals       - [(x1, y1), (x2, y2), ...] list of goal locations
+        instrumentation - Instrumentation collecting counters, timers and a trace, off by default
+        w           - suboptimality factor, at least 1
+        bypass      - see CBSSolver
+        node_limit  - see CBSSolver
+        """
+
+        CBSSolver.__init__(self, my_map, starts, goals, instrumentation, prioritize_conflicts=False,
+                           conflict_avoidance=True, bypass=bypass, node_limit=node_limit)
+        self.w = w
+        self.open_list = FocalList(w)
+        # lower bound of the optimal sum of costs when the solution was found
+        self.lower_bound = None
+
+    def root_node(self):
+        root = CBSSolver.root_node(self)
+        # lower bounds of the path lengths of the agents under the constraints of the node
+        root['lower_bounds'] = [0] * self.num_of_agents
+        return root
+
+    def child_node(self, node, constraint):
+        child = CBSSolver.child_node(self, node, constraint)
+        child['lower_bounds'] = node['lower_bounds']
+        return child
+
+    def push_node(self, node):
+        node['lb'] = sum(node['lower_bounds'])
+        node['id'] = self.num_of_generated
+        self.open_list.push(node['cost'], (len(node['collisions']), node['cost'], node['id']), node, node['lb'])
+        if self.instrumentation.tracing:
+            self.instrumentation.trace('generate', id=node['id'], cost=node['cost'], lb=node['lb'],
+                                       collisions=len(node['collisions']), constraints=node['depth'])
+        self.num_of_generated += 1
+
+    def pop_node(self):
+        self.lower_bound = self.open_list.lower_bound()
+        node = self.open_list.pop()
+        if self.instrumentation.tracing:
+            self.instrumentation.trace('expand', id=node['id'], cost=node['cost'], lb=node['lb'],
+                                       collisions=len(node['collisions']), constraints=node['depth'])
+        self.num_of_expanded += 1
+        return node
+
+    def replan_agents(self, node, agents):
+        """Replan the paths of agents in node with focal searches and update the lower bounds of node."""
+        lower_bounds = node['lower_bounds'].copy()
+        for agent in agents:
+            with self.instrumentation.timer('low_level'):
+                path, lower_bound = focal_a_star(self.grid, self.starts[agent], self.goals[agent],
+                                                 self.heuristics[agent], agent, self.agent_constraints(node, agent),
+                                                 self.w,
+                                                 self.conflict_avoidance_table(), self.node_limit,
+                                                 self.instrumentation)
+            self.instrumentation.count('low_level_calls')
+            if path is None:
+                return False
+            node['paths'][agent] = path
+            # the constraints of node include the ones of its parent, so the bound of the parent still holds
+            lower_bounds[agent] = max(lower_bounds[agent], lower_bound)
+        node['lower_bounds'] = lower_bounds
+        return True
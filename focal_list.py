@@ -0,0 +1,60 @@
+import heapq
+
+
+class FocalList(object):
+    """Open list of a focal search with suboptimality factor w.
+
+    Holds items with a cost f, a lower bound (by default f) and a focal key. pop
+    returns, among the items with f <= w * f_min, the one with the smallest focal key,
+    where f_min is the smallest lower bound of all items in the list. The focal bound
+    only grows, so f_min must never decrease; this holds for searches with a
+    consistent heuristic. The f of an item must be at most w times its lower bound.
+    """
+
+    def __init__(self, w):
+        self.w = w
+        self.open = []          # (lower bound, id) of every item, popped items are removed lazily
+        self.waiting = []       # (f, id, focal key, item) of the items above the focal bound
+        self.focal = []         # (focal key, id, f, item) of the items within the focal bound
+        self.popped = set()     # ids of the popped items that are still in open
+        self.bound = None
+        self.num_of_pushed = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, f, key, item, lower_bound=None):
+        id = self.num_of_pushed
+        self.num_of_pushed += 1
+        self.size += 1
+        heapq.heappush(self.open, (f if lower_bound is None else lower_bound, id))
+        if self.bound is not None and f <= self.bound:
+            heapq.heappush(self.focal, (key, id, f, item))
+        else:
+            heapq.heappush(self.waiting, (f, id, key, item))
+
+    def pop(self):
+        self.update_bound()
+        _, id, _, item = heapq.heappop(self.focal)
+        self.popped.add(id)
+        self.size -= 1
+        return item
+
+    def lower_bound(self):
+        """Return f_min, None if the list is empty."""
+        self.update_bound()
+        return self.open[0][0] if self.open else None
+
+    def update_bound(self):
+        open_list = self.open
+        while open_list and open_list[0][1] in self.popped:
+            self.popped.remove(heapq.heappop(open_list)[1])
+        if not open_list:
+            return
+        bound = self.w * open_list[0][0]
+        if self.bound is None or bound > self.bound:
+            self.bound = bound
+            while self.waiting and self.waiting[0][0] <= bound:
+                f, id, key, item = heapq.heappop(self.waiting)
+                heapq.heappush(self.focal, (key, id, f, item))
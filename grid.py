@@ -0,0 +1,86 @@
+import hashlib
+
+
+class Grid(object):
+    """Compact representation of a binary obstacle map.
+
+    Every location (x, y) is addressed by the integer cell id x * cols + y, so the
+    low-level search can hash, compare and store plain ints instead of tuples. The
+    neighbor lists are built once per map.
+    """
+
+    def __init__(self, my_map):
+        """my_map   - list of lists specifying obstacle positions"""
+
+        self.rows = len(my_map)
+        self.cols = len(my_map[0])
+        self.size = self.rows * self.cols
+
+        # one byte per cell, 1 if the cell is blocked
+        if isinstance(getattr(my_map, 'blocked', None), bytes):
+            # an instance_loader.BitMap already stores the cells this way
+            self.blocked = bytearray(my_map.blocked)
+        else:
+            self.blocked = bytearray(self.size)
+            for x in range(self.rows):
+                for y in range(self.cols):
+                    if my_map[x][y]:
+                        self.blocked[x * self.cols + y] = 1
+        self.num_free = self.size - sum(self.blocked)
+
+        self._digest = None
+        self.build_neighbors()
+
+    def build_neighbors(self):
+        # neighbors  - free cells reachable with one move, in the order of single_agent_planner.move()
+        # successors - the same cells followed by the cell itself (wait action)
+        self.neighbors = []
+        self.successors = []
+        blocked = self.blocked
+        rows = self.rows
+        cols = self.cols
+        # the moves (0, -1), (1, 0), (0, 1), (-1, 0) of move() as cell offsets, inlined for large maps
+        for x in range(rows):
+            for y in range(cols):
+                cell = x * cols + y
+                if blocked[cell]:
+                    self.neighbors.append(())
+                    self.successors.append(())
+                    continue
+                adjacent = []
+                if y > 0 and not blocked[cell - 1]:
+                    adjacent.append(cell - 1)
+                if x < rows - 1 and not blocked[cell + cols]:
+                    adjacent.append(cell + cols)
+                if y < cols - 1 and not blocked[cell + 1]:
+                    adjacent.append(cell + 1)
+                if x > 0 and not blocked[cell - cols]:
+                    adjacent.append(cell - cols)
+                adjacent = tuple(adjacent)
+                self.neighbors.append(adjacent)
+                self.successors.append(adjacent + (cell,))
+
+    def digest(self):
+        """Return a content hash of the map, used as cache key for per-map data."""
+        if self._digest is None:
+            h = hashlib.sha1('{}x{}:'.format(self.rows, self.cols).encode('ascii'))
+            h.update(bytes(self.blocked))
+            self._digest = h.hexdigest()
+        return self._digest
+
+    def cell(self, loc):
+        """Return the cell id of location (x, y)."""
+        return loc[0] * self.cols + loc[1]
+
+    def loc(self, cell):
+        """Return the location (x, y) of a cell id."""
+        return divmod(cell, self.cols)
+
+    def cells(self, locs):
+        return [loc[0] * self.cols + loc[1] for loc in locs]
+
+    def locs(self, cells):
+        return [divmod(cell, self.cols) for cell in cells]
+
+    def is_free(self, cell):
+        return not self.blocked[cell]
@@ -0,0 +1,198 @@
+import ast
+import mmap
+import os
+import sys
+from array import array
+from collections import OrderedDict
+
+
+def compute_distance_table(grid, goals):
+    """Return one dense distance row per goal, computed with a breadth-first search.
+
+    Row i holds the number of moves from every cell to goals[i], or -1 if goals[i]
+    cannot be reached from the cell. Moves have unit cost, so BFS is enough and
+    the rows are plain int arrays indexed by cell id.
+    """
+    neighbors = grid.neighbors
+    rows = []
+    for goal in goals:
+        distances = array('i', [-1]) * grid.size
+        distances[goal] = 0
+        frontier = [goal]
+        cost = 0
+        while frontier:
+            cost += 1
+            next_frontier = []
+            for loc in frontier:
+                for child_loc in neighbors[loc]:
+                    if distances[child_loc] < 0:
+                        distances[child_loc] = cost
+                        next_frontier.append(child_loc)
+            frontier = next_frontier
+        rows.append(distances)
+    return rows
+
+
+def save_npy(filename, row):
+    """Write an int row as a version 1.0 .npy file (readable by numpy.load)."""
+    header = "{'descr': '<i4', 'fortran_order': False, 'shape': (%d,), }" % len(row)
+    # the data must start at a multiple of 64 bytes, the header ends with a newline
+    padding = 64 - (10 + len(header) + 1) % 64
+    header = header + ' ' * (padding % 64) + '\n'
+    if sys.byteorder != 'little':
+        row = array('i', row)
+        row.byteswap()
+    tmp = '{}.{}.tmp'.format(filename, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(b'\x93NUMPY\x01\x00')
+        f.write(len(header).to_bytes(2, 'little'))
+        f.write(header.encode('latin1'))
+        f.write(row.tobytes())
+    # replace atomically so concurrent readers never see a partial file
+    os.replace(tmp, filename)
+
+
+def load_npy(filename, size):
+    """Memory-map a row written by save_npy. Return None if the file is missing or does not match."""
+    try:
+        f = open(filename, 'rb')
+    except OSError:
+        return None
+    with f:
+        prefix = f.read(10)
+        if len(prefix) < 10 or prefix[:6] != b'\x93NUMPY' or prefix[6] != 1:
+            return None
+        header_len = int.from_bytes(prefix[8:10], 'little')
+        try:
+            header = ast.literal_eval(f.read(header_len).decode('latin1'))
+        except (SyntaxError, ValueError):
+            return None
+        if header.get('descr') != '<i4' or header.get('shape') != (size,):
+            return None
+        offset = 10 + header_len
+        if os.fstat(f.fileno()).st_size != offset + 4 * size:
+            return None
+        if sys.byteorder != 'little':
+            f.seek(offset)
+            row = array('i')
+            row.fromfile(f, size)
+            row.byteswap()
+            return row
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapped)[offset:].cast('i')
+
+
+# bytes of heuristic rows a cache keeps in memory by default
+DEFAULT_CAPACITY = 256 * 2 ** 20
+
+
+class HeuristicCache(object):
+    """LRU cache of heuristic rows keyed by (map digest, goal cell).
+
+    The cache holds rows up to capacity bytes in total, a row of a map taking 4 bytes per
+    cell, so it keeps many rows of small maps and few of large ones.
+    If cache_dir is set, rows are also stored there as <digest>/<goal>.npy files and
+    memory-mapped on a miss, so a warm restart skips the search entirely.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, cache_dir=None):
+        self.capacity = capacity
+        self.cache_dir = cache_dir
+        self.rows = OrderedDict()
+        # bytes of the rows in self.rows
+        self.size = 0
+
+    def get_all(self, grid, goals):
+        """Return the heuristic rows of all goals, computing the missing ones in one batch."""
+        digest = grid.digest()
+        result = dict()
+        missing = []
+        for goal in goals:
+            if goal in result:
+                continue
+            row = self.lookup(grid, digest, goal)
+            if row is None:
+                missing.append(goal)
+                # reserve the slot so duplicate goals are computed once
+                result[goal] = None
+            else:
+                result[goal] = row
+        for goal, row in zip(missing, compute_distance_table(grid, missing)):
+            result[goal] = row
+            self.store(digest, goal, row)
+        return [result[goal] for goal in goals]
+
+    def get(self, grid, goal):
+        return self.get_all(grid, [goal])[0]
+
+    def lookup(self, grid, digest, goal):
+        key = (digest, goal)
+        row = self.rows.get(key)
+        if row is not None:
+            self.rows.move_to_end(key)
+            return row
+        if self.cache_dir is None:
+            return None
+        row = load_npy(self.filename(digest, goal), grid.size)
+        if row is not None:
+            self.remember(key, row)
+        return row
+
+    def store(self, digest, goal, row):
+        self.remember((digest, goal), row)
+        if self.cache_dir is not None:
+            filename = self.filename(digest, goal)
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            save_npy(filename, row)
+
+    def remember(self, key, row):
+        old = self.rows.get(key)
+        if old is not None:
+            self.size -= row_size(old)
+        self.rows[key] = row
+        self.rows.move_to_end(key)
+        self.size += row_size(row)
+        self.evict()
+
+    def set_capacity(self, capacity):
+        self.capacity = capacity
+        self.evict()
+
+    def evict(self):
+        """Drop the least recently used rows until the rows take at most capacity bytes."""
+        while self.size > self.capacity and self.rows:
+            _, row = self.rows.popitem(last=False)
+            self.size -= row_size(row)
+
+    def filename(self, digest, goal):
+        return os.path.join(self.cache_dir, digest, '{}.npy'.format(goal))
+
+    def clear(self):
+        self.rows.clear()
+        self.size = 0
+
+
+def row_size(row):
+    """Return the bytes of a heuristic row, an int array or a memory-mapped .npy row."""
+    return len(row) * row.itemsize
+
+
+# shared by all solvers of this process
+default_cache = HeuristicCache()
+
+
+def set_cache_dir(cache_dir):
+    """Persist heuristic rows of the default cache under cache_dir (None disables persistence)."""
+    default_cache.cache_dir = cache_dir
+
+
+def set_cache_capacity(capacity):
+    """Keep at most capacity bytes of heuristic rows in the default cache."""
+    default_cache.set_capacity(capacity)
+
+
+def get_heuristics(grid, goals, cache=None):
+    """Return the heuristic rows of goals from cache (default_cache if None)."""
+    if cache is None:
+        cache = default_cache
+    return cache.get_all(grid, goals)
@@ -1,27 +1,34 @@
 import time as timer
-from single_agent_planner import compute_heuristics, a_star, get_sum_of_cost
+from instrumentation import NULL_INSTRUMENTATION
+from map_context import as_context
+from single_agent_planner import get_planner, get_sum_of_cost
 
 
 class IndependentSolver(object):
     """A planner that plans for each robot independently."""
 
-    def __init__(self, my_map, starts, goals):
-        """my_map   - list of lists specifying obstacle positions
+    def __init__(self, my_map, starts, goals, low_level='a_star', instrumentation=None):
+        """my_map   - list of lists specifying obstacle positions, or a MapContext of them
         starts      - [(x1, y1), (x2, y2), ...] list of start locations
         goals       - [(x1, y1), (x2, y2), ...] list of goal locations
+        low_level   - low-level planner, 'a_star' or 'sipp'
+        instrumentation - Instrumentation counting the low-level searches, off by default
         """
 
-        self.my_map = my_map
-        self.starts = starts
-        self.goals = goals
+        self.context = as_context(my_map)
+        self.my_map = self.context.my_map
+        self.grid = self.context.grid
+        # the search works on integer cell ids, see grid.py
+        self.starts = self.grid.cells(starts)
+        self.goals = self.grid.cells(goals)
         self.num_of_agents = len(goals)
 
         self.CPU_time = 0
+        self.low_level = get_planner(low_level)
+        self.instrumentation = instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
 
         # compute heuristics for the low-level search
-        self.heuristics = []
-        for goal in self.goals:
-            self.heuristics.append(compute_heuristics(my_map, goal))
+        self.heuristics = self.context.heuristics(self.goals)
 
     def find_solution(self):
         """ Finds paths for all agents from their start locations to their goal locations."""
@@ -33,8 +40,8 @@ class IndependentSolver(object):
         # Task 0: Understand the following code (see the lab description for some hints)
 
         for i in range(self.num_of_agents):  # Find path for each agent
-            path = a_star(self.my_map, self.starts[i], self.goals[i], self.heuristics[i],
-                          i, [])
+            path = self.low_level(self.grid, self.starts[i], self.goals[i], self.heuristics[i],
+                                  i, [], instrumentation=self.instrumentation)
             if path is None:
                 raise BaseException('No solutions')
             result.append(path)
@@ -47,4 +54,4 @@ class IndependentSolver(object):
         print("CPU time (s):    {:.2f}".format(self.CPU_time))
         print("Sum of costs:    {}".format(get_sum_of_cost(result)))
 
-        return result
+        return [self.grid.locs(path) for path in result]
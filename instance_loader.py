@@ -0,0 +1,173 @@
+import hashlib
+import itertools
+import mmap
+import os
+import weakref
+from pathlib import Path
+
+# byte -> 0 for the free cells of both formats ('.' here, '.', 'G' and 'S' in MovingAI maps), 1 for the rest
+BLOCKED_TABLE = bytes(0 if chr(c) in '.GS' else 1 for c in range(256))
+
+# content hash -> BitMap, so instances on the same map share one BitMap (and one MapContext).
+# The maps are only held weakly, a map nothing else refers to any more is freed
+bitmaps = weakref.WeakValueDictionary()
+# (path, modification time, size) of a MovingAI .map file -> its BitMap, also held weakly
+map_files = weakref.WeakValueDictionary()
+
+
+class BitMap(object):
+    """Obstacle map stored as one byte per cell, 1 if the cell is blocked.
+
+    Indexed like the list of lists it replaces, my_map[x][y] is truthy if (x, y) is
+    blocked, but takes rows * cols bytes instead of a Python bool reference per cell.
+    grid.Grid copies the bytes directly instead of walking the rows.
+    """
+
+    __slots__ = ('rows', 'cols', 'blocked', 'view', '_digest', '__weakref__')
+
+    def __init__(self, rows, cols, blocked):
+        """rows     - number of rows of the map
+        cols        - number of columns of the map
+        blocked     - bytes of rows * cols cells in row-major order, 1 if blocked
+        """
+
+        self.rows = rows
+        self.cols = cols
+        self.blocked = bytes(blocked)
+        self.view = memoryview(self.blocked)
+        self._digest = None
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, x):
+        if x < 0:
+            x += self.rows
+        if not 0 <= x < self.rows:
+            raise IndexError('row out of range')
+        return self.view[x * self.cols:(x + 1) * self.cols]
+
+    def digest(self):
+        """Return a content hash of the map, the same as grid.Grid.digest."""
+        if self._digest is None:
+            h = hashlib.sha1('{}x{}:'.format(self.rows, self.cols).encode('ascii'))
+            h.update(self.blocked)
+            self._digest = h.hexdigest()
+        return self._digest
+
+    def tolist(self):
+        """Return the map as list of lists of bools."""
+        return [[bool(cell) for cell in self[x]] for x in range(self.rows)]
+
+
+def intern_map(rows, cols, blocked):
+    """Return the BitMap of the cells, the one loaded before if the contents are the same."""
+    my_map = BitMap(rows, cols, blocked)
+    return bitmaps.setdefault(my_map.digest(), my_map)
+
+
+def parse_rows(lines, rows, cols, filename):
+    """Return the BitMap of rows lines of cells, spaces between the cells are ignored."""
+    cells = []
+    for x in range(rows):
+        line = next(lines, b'').strip().replace(b' ', b'')
+        if len(line) != cols:
+            raise BaseException('{}: row {} has {} cells instead of {}'.format(filename, x, len(line), cols))
+        cells.append(line.translate(BLOCKED_TABLE))
+    return intern_map(rows, cols, b''.join(cells))
+
+
+def load_instance(filename, num_agents=None):
+    """Return (my_map, starts, goals) of an instance file, reading only the first num_agents agents.
+
+    filename    - instance in the text format of instances/, or a MovingAI .scen file
+    num_agents  - number of agents to read, all if None
+    """
+
+    if not Path(filename).is_file():
+        raise BaseException(filename + " does not exist.")
+    if filename.endswith('.scen'):
+        return load_scenario(filename, num_agents)
+
+    with open(filename, 'rb') as f:
+        lines = iter(f)
+        # first line: #rows #columns
+        rows, cols = [int(x) for x in next(lines).split()]
+        # #rows lines with the map
+        my_map = parse_rows(lines, rows, cols, filename)
+        # #agents
+        count = int(next(lines))
+        if num_agents is not None:
+            count = min(count, num_agents)
+        # #agents lines with the start/goal positions
+        starts = []
+        goals = []
+        for line in itertools.islice(lines, count):
+            sx, sy, gx, gy = [int(x) for x in line.split()]
+            starts.append((sx, sy))
+            goals.append((gx, gy))
+    return my_map, starts, goals
+
+
+def load_map(filename):
+    """Return the BitMap of a MovingAI .map file, parsed once per file version."""
+    stat = os.stat(filename)
+    key = (os.path.realpath(filename), stat.st_mtime_ns, stat.st_size)
+    my_map = map_files.get(key)
+    if my_map is not None:
+        return my_map
+
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        # header: type <type>, height <rows>, width <cols>, map
+        header = dict()
+        offset = 0
+        while True:
+            end = data.find(b'\n', offset)
+            if end < 0:
+                raise BaseException('{}: no map section'.format(filename))
+            fields = data[offset:end].split()
+            offset = end + 1
+            if fields == [b'map']:
+                break
+            if len(fields) == 2:
+                header[fields[0].decode('ascii')] = fields[1]
+        rows = int(header['height'])
+        cols = int(header['width'])
+        my_map = parse_rows(iter(data[offset:].splitlines()), rows, cols, filename)
+    map_files[key] = my_map
+    return my_map
+
+
+def iter_scenario(filename):
+    """Yield (map file, start, goal) of every agent of a MovingAI .scen file, reading the file lazily.
+
+    The scenarios give locations as column x and row y, the start and goal are returned as (row, column).
+    """
+    directory = os.path.dirname(filename)
+    with open(filename, 'r') as f:
+        for line in f:
+            fields = line.rstrip('\r\n').split('\t') if '\t' in line else line.split()
+            if len(fields) < 8 or fields[0] == 'version':
+                continue
+            map_file = os.path.join(directory, fields[1])
+            if not os.path.isfile(map_file):
+                map_file = fields[1]
+            sx, sy, gx, gy = [int(x) for x in fields[4:8]]
+            yield map_file, (sy, sx), (gy, gx)
+
+
+def load_scenario(filename, num_agents=None):
+    """Return (my_map, starts, goals) of the first num_agents agents of a MovingAI .scen file."""
+    starts = []
+    goals = []
+    map_file = None
+    for agent_map, start, goal in itertools.islice(iter_scenario(filename), num_agents):
+        if map_file is None:
+            map_file = agent_map
+        elif agent_map != map_file:
+            raise BaseException('{}: agents on different maps {} and {}'.format(filename, map_file, agent_map))
+        starts.append(start)
+        goals.append(goal)
+    if map_file is None:
+        raise BaseException('{}: no agents'.format(filename))
+    return load_map(map_file), starts, goals
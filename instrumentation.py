@@ -0,0 +1,105 @@
+import json
+import time as timer
+from collections import defaultdict
+
+
+class Instrumentation(object):
+    """Counters, timers and an optional JSON lines trace of a search.
+
+    Solvers take an instance of this class; by default they get NULL_INSTRUMENTATION,
+    which records nothing. Check tracing before building the fields of a trace event,
+    so a disabled trace costs no formatting.
+    """
+
+    def __init__(self, trace_file=None):
+        """trace_file   - file name or open file to write one JSON object per event to, None for no trace"""
+
+        self.enabled = True
+        self.counters = defaultdict(int)
+        self.timers = defaultdict(float)
+        self.tracing = trace_file is not None
+        self.own_trace_file = isinstance(trace_file, str)
+        self.trace_file = open(trace_file, 'w', buffering=1) if self.own_trace_file else trace_file
+        self.start_time = timer.time()
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def timer(self, name):
+        """Context manager that adds the time spent in its block to the timer name."""
+        return Timer(self.timers, name)
+
+    def trace(self, event, **fields):
+        if self.tracing:
+            fields['event'] = event
+            fields['time'] = round(timer.time() - self.start_time, 6)
+            self.trace_file.write(json.dumps(fields) + '\n')
+
+    def summary(self):
+        return {'counters': dict(self.counters), 'timers': dict(self.timers)}
+
+    def print_summary(self):
+        for name in sorted(self.timers):
+            print("{:<20} {:.3f}s".format(name, self.timers[name]))
+        for name in sorted(self.counters):
+            print("{:<20} {}".format(name, self.counters[name]))
+
+    def close(self):
+        if self.own_trace_file:
+            self.trace_file.close()
+        self.tracing = False
+
+
+class Timer(object):
+    __slots__ = ('timers', 'name', 'start')
+
+    def __init__(self, timers, name):
+        self.timers = timers
+        self.name = name
+
+    def __enter__(self):
+        self.start = timer.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timers[self.name] += timer.perf_counter() - self.start
+        return False
+
+
+class NullTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class NullInstrumentation(object):
+    """Instrumentation that records nothing."""
+
+    enabled = False
+    tracing = False
+    null_timer = NullTimer()
+
+    def count(self, name, n=1):
+        pass
+
+    def timer(self, name):
+        return self.null_timer
+
+    def trace(self, event, **fields):
+        pass
+
+    def summary(self):
+        return {'counters': dict(), 'timers': dict()}
+
+    def print_summary(self):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
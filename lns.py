@@ -0,0 +1,215 @@
+import time as timer
+import random
+from prioritized import PrioritizedPlanningSolver, add_avoidance_path, avoidance_table
+from reservation_table import ReservationTable
+from single_agent_planner import get_sum_of_cost
+
+NEIGHBORHOODS = ('random', 'agent', 'map')
+
+
+class LNSSolver(object):
+    """Anytime large neighborhood search (MAPF-LNS) on top of prioritized planning.
+
+    Starts from the solution of PrioritizedPlanningSolver. Every iteration removes the paths
+    of a small neighborhood of agents and replans them one by one in random order, each
+    against the paths of all other agents. The new paths are kept if they lower the sum of
+    costs. The neighborhoods are chosen by one of NEIGHBORHOODS, or adaptively among them by
+    how much they improved the solution so far.
+    """
+
+    def __init__(self, my_map, starts, goals, neighborhood_size=8, neighborhood='adaptive', seed=0,
+                 low_level='a_star', instrumentation=None):
+        """my_map   - list of lists specifying obstacle positions, or a MapContext of them
+        starts      - [(x1, y1), (x2, y2), ...] list of start locations
+        goals       - [(x1, y1), (x2, y2), ...] list of goal locations
+        neighborhood_size - number of agents replanned per iteration
+        neighborhood - 'random', 'agent' (agents around the most delayed agent), 'map' (agents around
+                      an intersection of the map) or 'adaptive'
+        seed        - seed of the random choices, the search is deterministic for a given seed
+        low_level   - low-level planner, 'a_star' or 'sipp'
+        instrumentation - Instrumentation counting the low-level searches, off by default
+        """
+
+        if neighborhood != 'adaptive' and neighborhood not in NEIGHBORHOODS:
+            raise RuntimeError("Unknown neighborhood: {}".format(neighborhood))
+
+        self.initial_solver = PrioritizedPlanningSolver(my_map, starts, goals, low_level,
+                                                        instrumentation=instrumentation)
+        self.context = self.initial_solver.context
+        self.my_map = self.context.my_map
+        self.grid = self.initial_solver.grid
+        self.starts = self.initial_solver.starts
+        self.goals = self.initial_solver.goals
+        self.heuristics = self.initial_solver.heuristics
+        self.low_level = self.initial_solver.low_level
+        self.instrumentation = self.initial_solver.instrumentation
+        self.num_of_agents = len(goals)
+
+        self.neighborhood_size = neighborhood_size
+        self.neighborhood = neighborhood
+        self.rng = random.Random(seed)
+        # weights of the adaptive choice of the neighborhood
+        self.weights = dict((name, 1.0) for name in NEIGHBORHOODS)
+        self.reaction_factor = 0.1
+        # agents recently used as the center of an agent-based neighborhood
+        self.tabu = set()
+        # cells with more than two free neighbors, centers of map-based neighborhoods
+        self.intersections = [cell for cell in self.context.free_cells if len(self.grid.neighbors[cell]) > 2]
+
+        self.paths = None
+        self.sum_of_costs = None
+        self.reservations = ReservationTable()
+        self.num_of_iterations = 0
+        self.num_of_improvements = 0
+        self.history = []   # (seconds since start, sum of costs) of every improvement
+        self.CPU_time = 0
+
+    def find_solution(self, max_time=10, max_iterations=None, callback=None):
+        """ Improve the solution of prioritized planning until a limit is reached.
+
+        max_time        - stop after this many seconds
+        max_iterations  - stop after this many neighborhoods
+        callback        - function called with (paths, sum of costs) for the initial and every improved solution
+        Returns the best paths found. best_solution() returns them at any moment, e.g. from callback.
+        """
+
+        self.start_time = timer.time()
+        paths = self.initial_solver.find_solution()
+        self.paths = [self.grid.cells(path) for path in paths]
+        self.reservations.set_paths(self.paths)
+        self.sum_of_costs = get_sum_of_cost(self.paths)
+        self.record(callback)
+
+        while self.num_of_agents > 1 and \
+                (max_time is None or timer.time() - self.start_time < max_time) and \
+                (max_iterations is None or self.num_of_iterations < max_iterations):
+            name = self.choose_neighborhood()
+            neighborhood = self.select_neighborhood(name)
+            self.num_of_iterations += 1
+            improvement = self.replan_neighborhood(neighborhood)
+            if self.neighborhood == 'adaptive':
+                self.weights[name] = self.reaction_factor * improvement + \
+                    (1 - self.reaction_factor) * self.weights[name]
+            if improvement > 0:
+                self.num_of_improvements += 1
+                self.record(callback)
+
+        self.CPU_time = timer.time() - self.start_time
+
+        print("\n Improved the solution! \n")
+        print("CPU time (s):    {:.2f}".format(self.CPU_time))
+        print("Sum of costs:    {}".format(self.sum_of_costs))
+        print("Iterations:      {}".format(self.num_of_iterations))
+        print("Improvements:    {}".format(self.num_of_improvements))
+        return self.best_solution()
+
+    def best_solution(self):
+        """Return the best paths found so far, None before the initial solution."""
+        if self.paths is None:
+            return None
+        return [self.grid.locs(path) for path in self.paths]
+
+    def record(self, callback):
+        self.history.append((timer.time() - self.start_time, self.sum_of_costs))
+        if callback is not None:
+            callback(self.best_solution(), self.sum_of_costs)
+
+    def choose_neighborhood(self):
+        if self.neighborhood != 'adaptive':
+            return self.neighborhood
+        return self.rng.choices(NEIGHBORHOODS, [self.weights[name] for name in NEIGHBORHOODS])[0]
+
+    def select_neighborhood(self, name):
+        """Return a sorted list of at most neighborhood_size agents."""
+        size = min(self.neighborhood_size, self.num_of_agents)
+        if name == 'agent':
+            agents = self.agent_neighborhood(size)
+        elif name == 'map':
+            agents = self.map_neighborhood(size)
+        else:
+            agents = set()
+        # fill up with random agents
+        others = [agent for agent in range(self.num_of_agents) if agent not in agents]
+        agents.update(self.rng.sample(others, max(0, size - len(agents))))
+        return sorted(agents)
+
+    def agent_neighborhood(self, size):
+        """The most delayed agent and the agents that visit the cells of its path."""
+        candidates = [agent for agent in range(self.num_of_agents) if agent not in self.tabu]
+        if not candidates:
+            self.tabu.clear()
+            candidates = list(range(self.num_of_agents))
+        center = max(candidates, key=lambda agent: (self.delay(agent), -agent))
+        self.tabu.add(center)
+        agents = {center}
+        visitors = []
+        for cell in self.paths[center]:
+            for other in self.reservations.visits.get(cell, dict()):
+                if other not in agents:
+                    agents.add(other)
+                    visitors.append(other)
+        if len(visitors) > size - 1:
+            visitors = self.rng.sample(visitors, size - 1)
+        return {center} | set(visitors)
+
+    def map_neighborhood(self, size):
+        """The agents that visit the cells closest to a random intersection."""
+        agents = set()
+        if not self.intersections:
+            return agents
+        start = self.rng.choice(self.intersections)
+        seen = {start}
+        queue = [start]
+        for cell in queue:
+            for other in sorted(self.reservations.visits.get(cell, dict())):
+                agents.add(other)
+                if len(agents) >= size:
+                    return agents
+            for next_cell in self.grid.neighbors[cell]:
+                if next_cell not in seen:
+                    seen.add(next_cell)
+                    queue.append(next_cell)
+        return agents
+
+    def delay(self, agent):
+        return len(self.paths[agent]) - 1 - self.heuristics[agent][self.starts[agent]]
+
+    def replan_neighborhood(self, neighborhood):
+        """Replan the agents of neighborhood, keep the new paths if they are shorter. Return the gain in sum of costs."""
+        old_cost = get_sum_of_cost([self.paths[agent] for agent in neighborhood])
+        for agent in neighborhood:
+            self.reservations.remove_path(agent)
+
+        order = list(neighborhood)
+        self.rng.shuffle(order)
+        # lower bound of the cost of the agents not replanned yet
+        remaining = sum(self.heuristics[agent][self.starts[agent]] for agent in order)
+        new_cost = 0
+        new_paths = dict()
+        # built once from the paths of the other agents, then extended by each new path
+        constraint_table = avoidance_table(self.reservations.paths.values())
+        for agent in order:
+            remaining -= self.heuristics[agent][self.starts[agent]]
+            path = self.low_level(self.grid, self.starts[agent], self.goals[agent], self.heuristics[agent],
+                                  agent, constraint_table, instrumentation=self.instrumentation)
+            if path is None:
+                break
+            new_paths[agent] = path
+            self.reservations.add_path(agent, path)
+            add_avoidance_path(constraint_table, path)
+            new_cost += len(path) - 1
+            if new_cost + remaining >= old_cost:
+                break
+
+        if len(new_paths) == len(order) and new_cost < old_cost:
+            for agent in order:
+                self.paths[agent] = new_paths[agent]
+            self.sum_of_costs -= old_cost - new_cost
+            return old_cost - new_cost
+
+        # back to the old paths
+        for agent in new_paths:
+            self.reservations.remove_path(agent)
+        for agent in neighborhood:
+            self.reservations.add_path(agent, self.paths[agent])
+        return 0
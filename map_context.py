@@ -0,0 +1,34 @@
+from grid import Grid
+from heuristics import default_cache
+
+
+class MapContext(object):
+    """Everything the solvers derive from a map alone, built once and shared by all instances on it.
+
+    Holds the compact grid with its neighbor tables, the free cells and the heuristic
+    cache. Every solver takes a MapContext in place of my_map, so sweeping many
+    agent sets over one map, or a long-running service, builds them only once.
+    """
+
+    def __init__(self, my_map, heuristic_cache=None):
+        """my_map           - list of lists specifying obstacle positions
+        heuristic_cache     - HeuristicCache of the heuristic rows, heuristics.default_cache if None
+        """
+
+        self.my_map = my_map
+        self.grid = Grid(my_map)
+        self.heuristic_cache = heuristic_cache if heuristic_cache is not None else default_cache
+
+        # free cells in increasing order
+        self.free_cells = tuple(cell for cell in range(self.grid.size) if self.grid.is_free(cell))
+
+    def heuristics(self, goals):
+        """Return the heuristic rows of the goal cells, see heuristics.get_heuristics."""
+        return self.heuristic_cache.get_all(self.grid, goals)
+
+
+def as_context(my_map):
+    """Return my_map if it already is a MapContext, else a new MapContext of it."""
+    if isinstance(my_map, MapContext):
+        return my_map
+    return MapContext(my_map)
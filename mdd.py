@@ -0,0 +1,92 @@
+from collections import OrderedDict
+from single_agent_planner import build_constraint_table, is_constrained, constraint_set_key
+
+
+def build_mdd(grid, start_loc, goal_loc, h_values, agent, constraints, cost):
+    """Return the multi-valued decision diagram of all paths of agent with the given cost.
+
+    The MDD is a list with one level per timestep 0..cost. Level t maps every cell the
+    agent can be at at timestep t on such a path to the tuple of cells it can move to
+    at timestep t + 1. The last level only holds goal_loc. Returns None if there is no
+    path with this cost.
+    """
+
+    constraint_table = build_constraint_table(constraints, agent)
+    successors = grid.successors
+
+    # forward: cells reachable at timestep t from which the goal can still be reached in time
+    levels = [{start_loc: []}]
+    for t in range(1, cost + 1):
+        level = dict()
+        for loc, children in levels[-1].items():
+            for child_loc in successors[loc]:
+                if 0 <= h_values[child_loc] <= cost - t and \
+                        not is_constrained(loc, child_loc, t, constraint_table):
+                    children.append(child_loc)
+                    level[child_loc] = []
+        if not level:
+            return None
+        levels.append(level)
+
+    if goal_loc not in levels[cost]:
+        return None
+    # the agent stays at its goal after cost, which must not be forbidden
+    for t, vertices in constraint_table['vertex'].items():
+        if t > cost and goal_loc in vertices:
+            return None
+    permanent = constraint_table['permanent'].get(goal_loc)
+    if permanent is not None and permanent <= cost:
+        return None
+    for t, positive in constraint_table['positive'].items():
+        if t > cost and positive != [goal_loc]:
+            return None
+    levels[cost] = {goal_loc: ()}
+
+    # backward: keep only the cells that lead to the goal at timestep cost
+    for t in range(cost - 1, -1, -1):
+        next_level = levels[t + 1]
+        level = dict()
+        for loc, children in levels[t].items():
+            children = tuple(child_loc for child_loc in children if child_loc in next_level)
+            if children:
+                level[loc] = children
+        levels[t] = level
+
+    return levels
+
+
+def is_cardinal(mdd, collision):
+    """Return True if every path of the MDD of one of the agents of collision takes part in the collision."""
+    timestep = collision['timestep']
+    # after its last level the agent waits at its goal
+    if timestep >= len(mdd):
+        return True
+    # vertex collision
+    if len(collision['loc']) == 1:
+        return len(mdd[timestep]) == 1
+    # edge collision
+    return len(mdd[timestep - 1]) == 1 and len(mdd[timestep]) == 1
+
+
+class MDDCache(object):
+    """LRU cache of MDDs keyed by (agent, cost, constraints of the agent)."""
+
+    def __init__(self, grid, starts, goals, heuristics, capacity=10000):
+        self.grid = grid
+        self.starts = starts
+        self.goals = goals
+        self.heuristics = heuristics
+        self.capacity = capacity
+        self.mdds = OrderedDict()
+
+    def get(self, agent, cost, constraints):
+        key = (agent, cost, constraint_set_key(constraints, agent))
+        if key in self.mdds:
+            self.mdds.move_to_end(key)
+            return self.mdds[key]
+        mdd = build_mdd(self.grid, self.starts[agent], self.goals[agent], self.heuristics[agent],
+                        agent, constraints, cost)
+        self.mdds[key] = mdd
+        while len(self.mdds) > self.capacity:
+            self.mdds.popitem(last=False)
+        return mdd
@@ -0,0 +1,279 @@
+#!/usr/bin/python
+"""Long-running planning service speaking JSON lines on stdin/stdout.
+
+Every input line is one request, every output line the response to one request,
+tagged with the id of the request. Solves run in a pool of worker processes, so
+responses can come in a different order than the requests.
+
+    {"id": 1, "op": "load_map", "map_id": "lab", "map": ["....@", ".@...", ...]}
+    {"id": 2, "op": "load_map", "map_id": "lab", "file": "instances/test_1.txt"}
+    {"id": 3, "op": "solve", "map_id": "lab", "starts": [[0, 0], [1, 2]], "goals": [[4, 4], [0, 3]],
+     "solver": "CBS", "options": {"disjoint": true, "max_time": 5}}
+    {"id": 4, "op": "stats"}
+
+load_map takes the map as rows of '.' (free) and '@' (blocked), or the map of an
+instance file. solve options are the command line options of run_experiments.py,
+e.g. disjoint, heuristic, low_level, w, max_time, max_expansions. The responses are
+
+    {"id": 3, "status": "solved", "paths": [[[0, 0], ...], ...], "sum_of_costs": 12, "time": 0.01}
+    {"id": 3, "status": "timeout", "time": 5.0}       the solver stopped at its limits
+    {"id": 3, "status": "failed", "error": "No solutions", "time": 0.2}
+    {"id": 3, "status": "error", "error": "unknown map_id: lab"}   malformed request
+
+Loaded maps are kept in an LRU of map_capacity maps. Each worker keeps its own LRU
+of MapContexts, with the heuristic tables of the goals it has seen, so repeated
+solves on a map skip parsing and heuristic computation. A solve only carries the
+key of its map; a worker without the map answers that it is missing, and the solve
+is sent again with the map. If a worker dies, the solves in flight fail and the
+workers are restarted.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time as timer
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stdout
+import heuristics
+from map_context import MapContext
+from run_experiments import build_parser, find_paths, import_mapf_instance
+from single_agent_planner import get_sum_of_cost
+
+# options of a solve request that are not solver options
+SERVICE_OPTIONS = ('instance', 'agents', 'batch', 'jobs', 'time_limit', 'memory_limit', 'trace', 'profile', 'heuristic_cache',
+                   'heuristic_cache_size')
+
+# state of a worker process, set by init_worker
+worker_contexts = OrderedDict()     # map key -> MapContext
+worker_capacity = 16
+
+
+def init_worker(map_capacity, heuristic_cache_dir, heuristic_cache_size):
+    global worker_capacity
+    worker_capacity = map_capacity
+    if heuristic_cache_dir:
+        heuristics.set_cache_dir(heuristic_cache_dir)
+    if heuristic_cache_size is not None:
+        heuristics.set_cache_capacity(heuristic_cache_size)
+
+
+def get_worker_context(map_key, rows):
+    context = worker_contexts.get(map_key)
+    if context is None:
+        context = MapContext([[cell == '@' for cell in row] for row in rows])
+        worker_contexts[map_key] = context
+        while len(worker_contexts) > worker_capacity:
+            worker_contexts.popitem(last=False)
+    worker_contexts.move_to_end(map_key)
+    return context
+
+
+def solve_request(map_key, rows, starts, goals, args):
+    """Entry point of a worker: solve one request and return its response without the id.
+
+    rows is None unless the worker reported the map as missing before, the response is then
+    {'status': 'missing_map'} if the worker does not have the map.
+    """
+    if rows is None and map_key not in worker_contexts:
+        return {'status': 'missing_map'}
+    start_time = timer.time()
+    try:
+        context = get_worker_context(map_key, rows)
+        # the solvers report their progress on stdout, which carries the responses
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            paths = find_paths(context, [tuple(loc) for loc in starts], [tuple(loc) for loc in goals], args)
+    except BaseException as e:
+        return {'status': 'failed', 'error': str(e), 'time': timer.time() - start_time}
+    if paths is None:
+        return {'status': 'timeout', 'time': timer.time() - start_time}
+    return {'status': 'solved',
+            'paths': [[list(loc) for loc in path] for path in paths],
+            'sum_of_costs': get_sum_of_cost(paths),
+            'time': timer.time() - start_time}
+
+
+class PlanningService(object):
+    """Reads requests, keeps the loaded maps and dispatches solves to the workers."""
+
+    def __init__(self, outfile, jobs=1, map_capacity=16, heuristic_cache_dir=None, heuristic_cache_size=None):
+        """outfile          - file the responses are written to, one JSON object per line
+        jobs                - number of worker processes, 0 to solve in this process
+        map_capacity        - number of maps kept loaded, the least recently used one is dropped
+        heuristic_cache_dir - directory to persist heuristic tables in, see heuristics.set_cache_dir
+        heuristic_cache_size - bytes of heuristic tables each worker keeps in memory, see
+                               heuristics.set_cache_capacity. None keeps the default
+        """
+
+        self.outfile = outfile
+        self.output_lock = threading.Lock()
+        self.maps = OrderedDict()   # map id -> (map key, rows)
+        self.map_capacity = map_capacity
+        self.heuristic_cache_dir = heuristic_cache_dir
+        self.heuristic_cache_size = heuristic_cache_size
+        self.jobs = jobs
+        self.defaults = build_parser().parse_args([])
+        # guards pending and executor, which the callbacks of the workers change as well
+        self.lock = threading.Condition()
+        self.pending = 0
+        if jobs > 0:
+            self.executor = self.new_executor()
+        else:
+            self.executor = None
+            init_worker(map_capacity, heuristic_cache_dir, heuristic_cache_size)
+
+    def new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.jobs, initializer=init_worker,
+                                   initargs=(self.map_capacity, self.heuristic_cache_dir, self.heuristic_cache_size))
+
+    def handle(self, line):
+        line = line.strip()
+        if not line:
+            return
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            op = request.get('op', 'solve')
+            if op == 'load_map':
+                self.respond(request_id, self.load_map(request))
+            elif op == 'solve':
+                self.solve(request_id, request)
+            elif op == 'stats':
+                with self.lock:
+                    pending = self.pending
+                self.respond(request_id, {'status': 'ok', 'maps': list(self.maps), 'pending': pending})
+            else:
+                raise ValueError('unknown op: {}'.format(op))
+        except Exception as e:
+            self.respond(request_id, {'status': 'error', 'error': str(e)})
+
+    def load_map(self, request):
+        map_id = request['map_id']
+        if 'file' in request:
+            my_map = import_mapf_instance(request['file'])[0]
+            rows = [''.join('@' if cell else '.' for cell in row) for row in my_map]
+        else:
+            rows = [row.replace(' ', '') for row in request['map']]
+        if not rows or any(len(row) != len(rows[0]) or row.strip('.@') for row in rows):
+            raise ValueError('a map is a non-empty list of equally long rows of . and @')
+        map_key = hashlib.sha1('\n'.join(rows).encode('ascii')).hexdigest()
+        self.maps[map_id] = (map_key, rows)
+        self.maps.move_to_end(map_id)
+        while len(self.maps) > self.map_capacity:
+            self.maps.popitem(last=False)
+        return {'status': 'ok', 'map_id': map_id, 'rows': len(rows), 'cols': len(rows[0])}
+
+    def solve(self, request_id, request):
+        map_id = request['map_id']
+        if map_id not in self.maps:
+            raise ValueError('unknown map_id: {}'.format(map_id))
+        self.maps.move_to_end(map_id)
+        map_key, rows = self.maps[map_id]
+        starts = request['starts']
+        goals = request['goals']
+        if len(starts) != len(goals):
+            raise ValueError('expected as many starts as goals')
+
+        args = argparse.Namespace(**vars(self.defaults))
+        args.solver = request.get('solver', args.solver)
+        for name, value in request.get('options', dict()).items():
+            if not hasattr(args, name) or name in SERVICE_OPTIONS:
+                raise ValueError('unknown option: {}'.format(name))
+            setattr(args, name, value)
+
+        if self.executor is None:
+            self.respond(request_id, solve_request(map_key, rows, starts, goals, args))
+            return
+        with self.lock:
+            self.pending += 1
+        try:
+            # the rows are only sent to a worker that does not have the map, see finish
+            self.submit(request_id, (map_key, None, starts, goals, args), rows)
+        except BaseException:
+            with self.lock:
+                self.pending -= 1
+            raise
+
+    def submit(self, request_id, task, rows):
+        """Submit the arguments task of solve_request to the workers, restarting them if they are broken."""
+        executor = self.executor
+        try:
+            future = executor.submit(solve_request, *task)
+        except BrokenProcessPool:
+            executor = self.restart(executor)
+            future = executor.submit(solve_request, *task)
+        future.add_done_callback(lambda future: self.finish(request_id, future, executor, task, rows))
+
+    def finish(self, request_id, future, executor, task, rows):
+        try:
+            response = future.result()
+        except BrokenProcessPool as e:
+            # a worker died, e.g. out of memory, and the pool with it. The solves in flight fail,
+            # the next ones go to new workers
+            self.restart(executor)
+            response = {'status': 'failed', 'error': repr(e)}
+        except BaseException as e:
+            response = {'status': 'failed', 'error': repr(e)}
+        if response['status'] == 'missing_map':
+            map_key, _, starts, goals, args = task
+            try:
+                self.submit(request_id, (map_key, rows, starts, goals, args), rows)
+                return
+            except BaseException as e:
+                response = {'status': 'failed', 'error': repr(e)}
+        self.respond(request_id, response)
+        with self.lock:
+            self.pending -= 1
+            self.lock.notify_all()
+
+    def restart(self, executor):
+        """Replace the broken executor by new workers, unless that happened already. Return the current executor."""
+        with self.lock:
+            if self.executor is executor:
+                executor.shutdown(wait=False)
+                self.executor = self.new_executor()
+            return self.executor
+
+    def respond(self, request_id, response):
+        response = dict(response, id=request_id)
+        with self.output_lock:
+            self.outfile.write(json.dumps(response) + '\n')
+            self.outfile.flush()
+
+    def close(self):
+        """Wait for the pending solves and stop the workers."""
+        if self.executor is not None:
+            # a solve can still be sent again with its map, so the workers run until none is pending
+            with self.lock:
+                while self.pending > 0:
+                    self.lock.wait()
+            self.executor.shutdown(wait=True)
+
+
+def serve(infile, outfile, jobs=1, map_capacity=16, heuristic_cache_dir=None, heuristic_cache_size=None):
+    service = PlanningService(outfile, jobs, map_capacity, heuristic_cache_dir, heuristic_cache_size)
+    try:
+        for line in infile:
+            service.handle(line)
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serves MAPF solves as JSON lines on stdin/stdout')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='Number of worker processes, 0 to solve in the service process')
+    parser.add_argument('--map-capacity', type=int, default=16,
+                        help='Number of maps kept loaded')
+    parser.add_argument('--heuristic-cache', type=str, default=None,
+                        help='Directory to persist heuristic tables in, shared by the workers')
+    parser.add_argument('--heuristic-cache-size', type=int, default=None,
+                        help='Megabytes of heuristic tables kept in memory by each worker, defaults to '
+                             '{}'.format(heuristics.DEFAULT_CAPACITY // 2 ** 20))
+    args = parser.parse_args()
+    heuristic_cache_size = args.heuristic_cache_size * 2 ** 20 if args.heuristic_cache_size is not None else None
+    serve(sys.stdin, sys.stdout, args.jobs, args.map_capacity, args.heuristic_cache, heuristic_cache_size)
@@ -1,88 +1,228 @@
 import time as timer
-from single_agent_planner import compute_heuristics, a_star, get_sum_of_cost
+import random
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from instrumentation import Instrumentation, NULL_INSTRUMENTATION
+from map_context import as_context
+from single_agent_planner import NodeLimitReached, a_star, build_constraint_table, get_planner, get_sum_of_cost
+
+ORDERINGS = ('index', 'shortest', 'longest', 'congestion', 'random')
+
+
+def avoidance_table(paths=()):
+    """Return a constraint table that keeps an agent off paths, whose agents stay at their last locations.
+
+    The table is the one build_constraint_table returns for such constraints, and the planners take it in
+    place of a list of constraints. add_avoidance_path extends it by one more path, so agents planned one
+    after the other share a table instead of building the constraints of all earlier paths every time.
+    """
+    constraint_table = build_constraint_table([], None)
+    for path in paths:
+        add_avoidance_path(constraint_table, path)
+    return constraint_table
+
+
+def add_avoidance_path(constraint_table, path):
+    """Add the constraints that keep an agent from colliding with path to a table of avoidance_table."""
+    vertex = constraint_table['vertex']
+    edge = constraint_table['edge']
+    last = len(path) - 1
+    for t in range(len(path)):
+        vertex.setdefault(t, set()).add(path[t])
+        # swapping locations with the other agent
+        if t > 0 and path[t - 1] != path[t]:
+            edge.setdefault(t, set()).add((path[t], path[t - 1]))
+    # a permanent constraint where the other agent stays at its goal
+    permanent = constraint_table['permanent']
+    if path[last] not in permanent or last < permanent[path[last]]:
+        permanent[path[last]] = last
+    constraint_table['latest'] = max(constraint_table['latest'], last)
+
+
+def plan_in_order(grid, starts, goals, heuristics, order, planner=a_star, instrumentation=None):
+    """Plan the agents one after the other in order, each avoiding the paths of the agents before it.
+
+    planner     - low-level planner with the arguments of a_star, see get_planner
+    instrumentation - Instrumentation counting the low-level searches, or None
+
+    Returns the paths as cell ids indexed by agent, None if an agent has no path.
+    """
+    paths = [None] * len(starts)
+    constraint_table = avoidance_table()
+    for agent in order:
+        ##############################
+        # Task 2: the constraints of an agent keep it off the paths of all agents planned before it
+        path = planner(grid, starts[agent], goals[agent], heuristics[agent],
+                       agent, constraint_table, instrumentation=instrumentation)
+        if path is None:
+            return None
+        paths[agent] = path
+        add_avoidance_path(constraint_table, path)
+    return paths
+
+
+# state of a worker process of parallel restarts, set by init_worker
+worker_problem = None
+
+
+def init_worker(grid, starts, goals, heuristics, planner):
+    global worker_problem
+    worker_problem = (grid, starts, goals, heuristics, planner)
+
+
+def plan_in_worker(order):
+    """Return the paths of the attempt in order, or None, and the counters of its low-level searches."""
+    grid, starts, goals, heuristics, planner = worker_problem
+    instrumentation = Instrumentation()
+    paths = plan_in_order(grid, starts, goals, heuristics, order, planner, instrumentation)
+    return paths, dict(instrumentation.counters)
 
 
 class PrioritizedPlanningSolver(object):
     """A planner that plans for each robot sequentially."""
 
-    def __init__(self, my_map, starts, goals):
-        """my_map   - list of lists specifying obstacle positions
+    def __init__(self, my_map, starts, goals, low_level='a_star', node_limit=None, instrumentation=None):
+        """my_map   - list of lists specifying obstacle positions, or a MapContext of them
         starts      - [(x1, y1), (x2, y2), ...] list of start locations
         goals       - [(x1, y1), (x2, y2), ...] list of goal locations
+        low_level   - low-level planner, 'a_star' or 'sipp'
+        node_limit  - nodes a low-level search may store, find_solution stops when one stores more
+        instrumentation - Instrumentation counting the low-level searches, off by default
         """
 
-        self.my_map = my_map
-        self.starts = starts
-        self.goals = goals
+        self.context = as_context(my_map)
+        self.my_map = self.context.my_map
+        self.grid = self.context.grid
+        # the search works on integer cell ids, see grid.py
+        self.starts = self.grid.cells(starts)
+        self.goals = self.grid.cells(goals)
         self.num_of_agents = len(goals)
 
         self.CPU_time = 0
+        # priority order of the solution found
+        self.order = None
+        self.low_level = get_planner(low_level)
+        if node_limit is not None:
+            self.low_level = partial(self.low_level, node_limit=node_limit)
+        self.instrumentation = instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
 
         # compute heuristics for the low-level search
-        self.heuristics = []
-        for goal in self.goals:
-            self.heuristics.append(compute_heuristics(my_map, goal))
-
-    def find_solution(self):
-        """ Finds paths for all agents from their start locations to their goal locations."""
+        self.heuristics = self.context.heuristics(self.goals)
+
+    def find_solution(self, ordering='index', restarts=0, seed=0, jobs=1, best=False):
+        """ Finds paths for all agents from their start locations to their goal locations.
+
+        ordering    - priority order of the first attempt, one of ORDERINGS: agent index, shortest or
+                      longest distance to the goal first, most congested start and goal first, or random
+        restarts    - number of further attempts in random orders, made when an attempt fails (or always
+                      with best)
+        seed        - seed of the random orders, the same seed gives the same orders
+        jobs        - make the attempts in this many worker processes. Without best the first attempt to
+                      succeed wins, which is not necessarily the first in order
+        best        - make all attempts and keep the solution with the smallest sum of costs
+        Returns the paths, or None if a low-level search hit the node limit.
+        """
 
         start_time = timer.time()
-        result = []
-        constraints = []
-        # # 1.2
-        # constraints.append({'agent': 0, 'loc': [(1, 5)], 'timestep': 4})
-        # # 1.3
-        # constraints.append({'agent': 1, 'loc': [(1, 2), (1, 3)], 'timestep': 1})
-        # # 1.4
-        # constraints.append({'agent': 0, 'loc': [(1, 5)], 'timestep': 10})
-        #test
-        #constraints.append({'agent': 1, 'loc': [(1, 4)], 'timestep': 3})
-        # 1.5 set of constraints to find collision-free paths
-        # constraints.append({'agent': 1, 'loc': [(1, 3), (1, 2)], 'timestep': 2})
-        # constraints.append({'agent': 1, 'loc': [(1, 3), (1, 4)], 'timestep': 2})
-        # constraints.append({'agent': 1, 'loc': [(1, 3)], 'timestep': 2})
-        # constraints.append({'agent': 1, 'loc': [(1, 2)], 'timestep': 2})
-
-
-        for i in range(self.num_of_agents):  # Find path for each agent
-            path = a_star(self.my_map, self.starts[i], self.goals[i], self.heuristics[i],
-                          i, constraints)
-            if path is None:
-                raise BaseException('No solutions')
-            result.append(path)
-
-            ##############################
-            # Task 2: Add constraints here
-            #         Useful variables:
-            #            * path contains the solution path of the current (i'th) agent, e.g., [(1,1),(1,2),(1,3)]
-            #            * self.num_of_agents has the number of total agents
-            #            * constraints: array of constraints to consider for future A* searches
-
-            # 2.1 itreates over the path of the current agent
-            for j in range(len(path)):
-                # add constraints for all future agents
-                for k in range(i + 1, self.num_of_agents):
-
-                    # add a permenant constraint if the current agent i is at the goal location
-                    if path[j] == self.goals[i]:
-                        constraints.append({'agent': k, 'loc': [path[j]], 'timestep': j, 'at_goal': True})
-                    else:
-                        # normal vertex constraints
-                        constraints.append({'agent': k, 'loc': [path[j]], 'timestep': j})
-
-                    # for all adjacent locations (edge) in the path
-                    if j < len(path) - 1:
-                        # edge constraints for both directions
-                        constraints.append({'agent': k, 'loc': [path[j], path[j + 1]], 'timestep': j + 1})
-                        constraints.append({'agent': k, 'loc': [path[j + 1], path[j]], 'timestep': j + 1})
-
-
-            ##############################
+        orders = self.orders(ordering, restarts, seed)
+        try:
+            if jobs > 1 and len(orders) > 1:
+                result, order = self.attempt_in_parallel(orders, jobs, best)
+            else:
+                result, order = self.attempt(orders, best)
+        except NodeLimitReached:
+            self.CPU_time = timer.time() - start_time
+            print("\n Stopped at the node limit \n")
+            return None
+        if result is None:
+            raise BaseException('No solutions')
+        self.order = order
 
         self.CPU_time = timer.time() - start_time
 
         print("\n Found a solution! \n")
         print("CPU time (s):    {:.2f}".format(self.CPU_time))
         print("Sum of costs:    {}".format(get_sum_of_cost(result)))
+        result = [self.grid.locs(path) for path in result]
         print(result)
         return result
+
+    def orders(self, ordering, restarts, seed):
+        """Return the priority orders of all attempts, the one of ordering followed by restarts random ones."""
+        if ordering not in ORDERINGS:
+            raise RuntimeError("Unknown ordering: {}".format(ordering))
+        rng = random.Random(seed)
+        agents = list(range(self.num_of_agents))
+        if ordering == 'index':
+            first = agents
+        elif ordering == 'shortest':
+            first = sorted(agents, key=lambda agent: (self.distance(agent), agent))
+        elif ordering == 'longest':
+            first = sorted(agents, key=lambda agent: (-self.distance(agent), agent))
+        elif ordering == 'congestion':
+            congestion = self.congestion()
+            first = sorted(agents, key=lambda agent: (-congestion[agent], agent))
+        else:
+            first = rng.sample(agents, len(agents))
+        return [first] + [rng.sample(agents, len(agents)) for _ in range(restarts)]
+
+    def distance(self, agent):
+        return self.heuristics[agent][self.starts[agent]]
+
+    def congestion(self):
+        """Return for every agent the number of starts and goals of other agents at or next to its own start and goal."""
+        endpoints = Counter(self.starts + self.goals)
+        congestion = []
+        for agent in range(self.num_of_agents):
+            near = set(self.grid.successors[self.starts[agent]]) | set(self.grid.successors[self.goals[agent]])
+            # not counting the start and goal of the agent itself
+            congestion.append(sum(endpoints[cell] for cell in near) - 2)
+        return congestion
+
+    def attempt(self, orders, best):
+        """Plan in every order until one succeeds (or all with best). Return (paths, order) or (None, None)."""
+        if best:
+            return self.best_result(orders, [plan_in_order(self.grid, self.starts, self.goals, self.heuristics, order,
+                                                           self.low_level, self.instrumentation) for order in orders])
+        for order in orders:
+            paths = plan_in_order(self.grid, self.starts, self.goals, self.heuristics, order, self.low_level,
+                                  self.instrumentation)
+            if paths is not None:
+                return paths, order
+        return None, None
+
+    def attempt_in_parallel(self, orders, jobs, best):
+        """Like attempt, in worker processes."""
+        # heuristic rows read from a heuristic cache directory are memory maps, which cannot be pickled
+        heuristics = [array('i', row) for row in self.heuristics]
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                       initargs=(self.grid, self.starts, self.goals, heuristics, self.low_level))
+        try:
+            futures = [executor.submit(plan_in_worker, order) for order in orders]
+            if best:
+                return self.best_result(orders, [self.worker_result(future) for future in futures])
+            for future in as_completed(futures):
+                paths = self.worker_result(future)
+                if paths is not None:
+                    return paths, orders[futures.index(future)]
+            return None, None
+        finally:
+            # without best the attempts still running are not waited for
+            executor.shutdown(wait=best, cancel_futures=True)
+
+    def worker_result(self, future):
+        """Return the paths of a finished attempt of a worker, after adding its counters to the instrumentation."""
+        paths, counters = future.result()
+        for name, n in counters.items():
+            self.instrumentation.count(name, n)
+        return paths
+
+    def best_result(self, orders, results):
+        """Return the (paths, order) with the smallest sum of costs, the first one of them on ties."""
+        result, result_order = None, None
+        for order, paths in zip(orders, results):
+            if paths is not None and (result is None or get_sum_of_cost(paths) < get_sum_of_cost(result)):
+                result, result_order = paths, order
+        return result, result_order
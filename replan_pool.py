@@ -0,0 +1,79 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from instrumentation import Instrumentation
+from reservation_table import ReservationTable
+from single_agent_planner import get_planner
+
+# state of a worker process, set by init_worker
+worker_problem = None
+worker_memory = None
+
+
+def init_worker(grid, starts, goals, memory_name, low_level, node_limit):
+    global worker_problem, worker_memory
+    # the block belongs to the solver, which unlinks it when the search is done
+    worker_memory = shared_memory.SharedMemory(name=memory_name)
+    rows = worker_memory.buf.cast('i')
+    heuristics = [rows[i * grid.size:(i + 1) * grid.size] for i in range(len(goals))]
+    worker_problem = (grid, starts, goals, heuristics, get_planner(low_level), node_limit)
+
+
+def replan_in_worker(agent, constraints, cat_paths):
+    """Plan the path of agent under constraints, return it with the counters of the search."""
+    grid, starts, goals, heuristics, planner, node_limit = worker_problem
+    cat = None
+    if cat_paths is not None:
+        cat = ReservationTable()
+        cat.set_paths(cat_paths)
+    instrumentation = Instrumentation()
+    path = planner(grid, starts[agent], goals[agent], heuristics[agent], agent, constraints, node_limit, cat=cat,
+                   instrumentation=instrumentation)
+    return path, dict(instrumentation.counters)
+
+
+class ReplanPool(object):
+    """Worker processes that run the low-level searches of CBS nodes.
+
+    The heuristic rows are copied once into a shared memory block that all workers map
+    read-only, so a task only carries the agent, its constraints and, for conflict
+    avoidance, the paths of the other agents.
+    """
+
+    def __init__(self, jobs, grid, starts, goals, heuristics, low_level='a_star', node_limit=None):
+        """jobs     - number of worker processes
+        grid        - Grid of the map
+        starts      - start cells of the agents
+        goals       - goal cells of the agents
+        heuristics  - heuristic row of every agent, see heuristics.get_heuristics
+        low_level   - low-level planner, 'a_star' or 'sipp'
+        node_limit  - nodes a search may store, see a_star. A search that hits it raises NodeLimitReached in replan
+        """
+
+        size = grid.size
+        self.memory = shared_memory.SharedMemory(create=True, size=max(1, 4 * size * len(heuristics)))
+        rows = self.memory.buf.cast('i')
+        for i, row in enumerate(heuristics):
+            rows[i * size:(i + 1) * size] = array('i', row)
+        rows.release()
+        self.executor = ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                            initargs=(grid, starts, goals, self.memory.name, low_level, node_limit))
+
+    def replan(self, tasks, instrumentation):
+        """Run the (agent, constraints, paths of conflict avoidance or None) tasks, return the paths in their order.
+
+        The counters of the searches are added to instrumentation.
+        """
+        paths = []
+        if not tasks:
+            return paths
+        for path, counters in self.executor.map(replan_in_worker, *zip(*tasks)):
+            for name, n in counters.items():
+                instrumentation.count(name, n)
+            paths.append(path)
+        return paths
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.memory.close()
+        self.memory.unlink()
@@ -0,0 +1,171 @@
+from bisect import bisect_right
+
+
+class ReservationTable(object):
+    """Space-time reservations of a set of agent paths.
+
+    Maps every (location, timestep) and every move (from, to, timestep) to the agents
+    that occupy it, so the collisions of a path with all stored paths are found in
+    time linear in the length of the path. An agent stays at the last location of its
+    path forever. Locations can be cell ids or (x, y) tuples.
+    """
+
+    def __init__(self):
+        self.paths = dict()     # agent -> path
+        self.vertices = dict()  # (loc, timestep) -> set of agents
+        self.edges = dict()     # (from, to, timestep) -> set of agents, moves arriving at timestep
+        self.goals = dict()     # loc -> {agent: timestep from which the agent stays at loc}
+        self.visits = dict()    # loc -> {agent: increasing list of timesteps the agent is at loc}
+
+    def add_path(self, agent, path):
+        if agent in self.paths:
+            self.remove_path(agent)
+        self.paths[agent] = path
+        for t in range(len(path)):
+            loc = path[t]
+            self.vertices.setdefault((loc, t), set()).add(agent)
+            self.visits.setdefault(loc, dict()).setdefault(agent, []).append(t)
+            if t > 0 and path[t - 1] != loc:
+                self.edges.setdefault((path[t - 1], loc, t), set()).add(agent)
+        self.goals.setdefault(path[-1], dict())[agent] = len(path) - 1
+
+    def remove_path(self, agent):
+        path = self.paths.pop(agent)
+        for t in range(len(path)):
+            loc = path[t]
+            remove_agent(self.vertices, (loc, t), agent)
+            if t > 0 and path[t - 1] != loc:
+                remove_agent(self.edges, (path[t - 1], loc, t), agent)
+        for loc in set(path):
+            remove_agent(self.visits, loc, agent)
+        remove_agent(self.goals, path[-1], agent)
+
+    def set_paths(self, paths):
+        """Make the table hold paths[i] for every agent i, re-adding only the paths that changed."""
+        for agent in range(len(paths)):
+            if self.paths.get(agent) is not paths[agent]:
+                self.add_path(agent, paths[agent])
+        for agent in [agent for agent in self.paths if agent >= len(paths)]:
+            self.remove_path(agent)
+
+    def horizon(self):
+        """Return the timestep from which all agents wait at their goals."""
+        return max((len(path) - 1 for path in self.paths.values()), default=0)
+
+    def find_conflicts(self, agent, path):
+        """Return {other agent: first collision between path and the path of the other agent}.
+
+        The entries of agent itself are ignored, so path may replace the stored path of agent.
+        Collisions use the format of cbs.detect_collisions, with a1 < a2.
+        """
+
+        # other agent -> (timestep, 0 for edge / 1 for vertex, loc as seen by the agent)
+        first = dict()
+
+        def record(other, timestep, kind, loc):
+            if other != agent:
+                best = first.get(other)
+                if best is None or (timestep, kind) < best[:2]:
+                    first[other] = (timestep, kind, loc)
+
+        for t in range(len(path)):
+            loc = path[t]
+            for other in self.vertices.get((loc, t), ()):
+                record(other, t, 1, [loc])
+            # agents that already wait at their goal
+            for other, arrival in self.goals.get(loc, dict()).items():
+                if arrival < t:
+                    record(other, t, 1, [loc])
+            # agents that swap locations with us
+            if t > 0 and path[t - 1] != loc:
+                for other in self.edges.get((loc, path[t - 1], t), ()):
+                    record(other, t, 0, [path[t - 1], loc])
+
+        # agents that pass our goal after we arrived there
+        goal = path[-1]
+        arrival = len(path) - 1
+        for other, timesteps in self.visits.get(goal, dict()).items():
+            i = bisect_right(timesteps, arrival)
+            if i < len(timesteps):
+                record(other, timesteps[i], 1, [goal])
+
+        conflicts = dict()
+        for other, (timestep, kind, loc) in first.items():
+            if other < agent and kind == 0:
+                # edges are given in the direction a1 moves
+                loc = [loc[1], loc[0]]
+            conflicts[other] = {'a1': min(agent, other), 'a2': max(agent, other), 'loc': loc, 'timestep': timestep}
+        return conflicts
+
+    def count_conflicts(self, agent, curr_loc, next_loc, timestep):
+        """Return the number of collisions of other agents with the move of agent from curr_loc to next_loc at timestep."""
+        count = 0
+        for other in self.vertices.get((next_loc, timestep), ()):
+            if other != agent:
+                count += 1
+        for other, arrival in self.goals.get(next_loc, dict()).items():
+            if other != agent and arrival < timestep:
+                count += 1
+        if curr_loc != next_loc:
+            for other in self.edges.get((next_loc, curr_loc, timestep), ()):
+                if other != agent:
+                    count += 1
+        return count
+
+
+def remove_agent(index, key, agent):
+    agents = index[key]
+    if isinstance(agents, set):
+        agents.discard(agent)
+    else:
+        agents.pop(agent, None)
+    if not agents:
+        del index[key]
+
+
+def find_collisions(paths):
+    """Return the first collision of every colliding pair of paths, like cbs.detect_collisions."""
+    table = ReservationTable()
+    collisions = []
+    for agent in range(len(paths)):
+        collisions.extend(table.find_conflicts(agent, paths[agent]).values())
+        table.add_path(agent, paths[agent])
+    collisions.sort(key=lambda collision: (collision['a1'], collision['a2']))
+    return collisions
+
+
+def validate_paths(my_map, starts, goals, paths):
+    """Check the output of any solver. Return a list of problems, empty if the paths are a valid solution.
+
+    my_map   - list of lists specifying obstacle positions
+    starts   - [(x1, y1), (x2, y2), ...] list of start locations
+    goals    - [(x1, y1), (x2, y2), ...] list of goal locations
+    paths    - [[(x11, y11), (x12, y12), ...], ...] one path per agent
+    """
+
+    if paths is None or len(paths) != len(goals):
+        return ['expected {} paths'.format(len(goals))]
+
+    problems = []
+    for i in range(len(paths)):
+        path = [tuple(loc) for loc in paths[i]]
+        if not path:
+            problems.append('agent {}: empty path'.format(i))
+            continue
+        if path[0] != tuple(starts[i]):
+            problems.append('agent {}: starts at {} instead of {}'.format(i, path[0], starts[i]))
+        if path[-1] != tuple(goals[i]):
+            problems.append('agent {}: ends at {} instead of {}'.format(i, path[-1], goals[i]))
+        for t in range(len(path)):
+            x, y = path[t]
+            if x < 0 or x >= len(my_map) or y < 0 or y >= len(my_map[0]) or my_map[x][y]:
+                problems.append('agent {}: blocked location {} at timestep {}'.format(i, path[t], t))
+            elif t > 0 and abs(x - path[t - 1][0]) + abs(y - path[t - 1][1]) > 1:
+                problems.append('agent {}: jumps from {} to {} at timestep {}'.format(i, path[t - 1], path[t], t))
+
+    if any(not path for path in paths):
+        return problems
+    for collision in find_collisions([[tuple(loc) for loc in path] for path in paths]):
+        problems.append('agents {} and {} collide at {} at timestep {}'.format(
+            collision['a1'], collision['a2'], collision['loc'], collision['timestep']))
+    return problems
@@ -1,14 +1,25 @@
 #!/usr/bin/python
 import argparse
 import glob
-from pathlib import Path
+from collections import OrderedDict
+from functools import partial
 from cbs import CBSSolver
+from ecbs import ECBSSolver
 from independent import IndependentSolver
 from prioritized import PrioritizedPlanningSolver
-from visualize import Animation
+from lns import LNSSolver
 from single_agent_planner import get_sum_of_cost
+from reservation_table import validate_paths
+from batch_runner import run_batch
+from instrumentation import Instrumentation
+from map_context import MapContext
+from instance_loader import load_instance
+import heuristics
 
 SOLVER = "CBS"
+LNS_TIME = 10
+# collision selections of CBS: cardinal collisions first (using MDDs), or the first collision found
+CONFLICT_SELECTIONS = ('cardinal', 'first')
 
 def print_mapf_instance(my_map, starts, goals):
     print('Start locations')
@@ -34,85 +45,216 @@ def print_locations(my_map, locations):
     print(to_print)
 
 
-def import_mapf_instance(filename):
-    f = Path(filename)
-    if not f.is_file():
-        raise BaseException(filename + " does not exist.")
-    f = open(filename, 'r')
-    # first line: #rows #columns
-    line = f.readline()
-    rows, columns = [int(x) for x in line.split(' ')]
-    rows = int(rows)
-    columns = int(columns)
-    # #rows lines with the map
-    my_map = []
-    for r in range(rows):
-        line = f.readline()
-        my_map.append([])
-        for cell in line:
-            if cell == '@':
-                my_map[-1].append(True)
-            elif cell == '.':
-                my_map[-1].append(False)
-    # #agents
-    line = f.readline()
-    num_agents = int(line)
-    # #agents lines with the start/goal positions
-    starts = []
-    goals = []
-    for a in range(num_agents):
-        line = f.readline()
-        sx, sy, gx, gy = [int(x) for x in line.split(' ')]
-        starts.append((sx, sy))
-        goals.append((gx, gy))
-    f.close()
-    return my_map, starts, goals
+def import_mapf_instance(filename, num_agents=None):
+    """Return (my_map, starts, goals) of an instance file, see instance_loader.load_instance."""
+    return load_instance(filename, num_agents)
 
 
-if __name__ == '__main__':
+# content hash of the map -> MapContext, shared by the instances on the same map. The least
+# recently used context is dropped beyond MAP_CONTEXT_CAPACITY, which frees its map
+map_contexts = OrderedDict()
+MAP_CONTEXT_CAPACITY = 16
+
+
+def get_map_context(my_map):
+    key = my_map.digest()
+    if key not in map_contexts:
+        map_contexts[key] = MapContext(my_map)
+        while len(map_contexts) > MAP_CONTEXT_CAPACITY:
+            map_contexts.popitem(last=False)
+    map_contexts.move_to_end(key)
+    return map_contexts[key]
+
+
+def find_paths(my_map, starts, goals, args, instrumentation=None):
+    """Run the solver selected by the command line arguments args. my_map can be a MapContext."""
+    solver_name = args.solver
+    if solver_name == "CBS":
+        print("***Run CBS***")
+        if args.conflict_selection not in CONFLICT_SELECTIONS:
+            raise RuntimeError("Unknown conflict selection: {}".format(args.conflict_selection))
+        cbs = CBSSolver(my_map, starts, goals, instrumentation,
+                        prioritize_conflicts=args.conflict_selection == 'cardinal', heuristic=args.heuristic,
+                        conflict_avoidance=args.cat, bypass=args.bypass, low_level=args.low_level,
+                        jobs=args.cbs_jobs, top_k=args.top_k, node_limit=args.node_limit)
+        paths = cbs.find_solution(args.disjoint, args.max_time, args.max_expansions)
+        print(cbs.result)
+    elif solver_name == "ECBS":
+        print("***Run ECBS***")
+        ecbs = ECBSSolver(my_map, starts, goals, instrumentation, w=args.w, bypass=args.bypass,
+                          node_limit=args.node_limit)
+        paths = ecbs.find_solution(args.disjoint, args.max_time, args.max_expansions)
+        print(ecbs.result)
+        if paths is not None:
+            print("Lower bound:     {} (w = {})".format(ecbs.lower_bound, args.w))
+    elif solver_name == "Independent":
+        print("***Run Independent***")
+        solver = IndependentSolver(my_map, starts, goals, args.low_level, instrumentation)
+        paths = solver.find_solution()
+    elif solver_name == "Prioritized":
+        print("***Run Prioritized***")
+        solver = PrioritizedPlanningSolver(my_map, starts, goals, args.low_level, args.node_limit, instrumentation)
+        paths = solver.find_solution(args.ordering, args.restarts, args.seed, args.restart_jobs, args.best)
+    elif solver_name == "LNS":
+        print("***Run LNS***")
+        solver = LNSSolver(my_map, starts, goals, args.neighborhood_size, args.neighborhood,
+                           low_level=args.low_level, instrumentation=instrumentation)
+        paths = solver.find_solution(args.max_time if args.max_time is not None else LNS_TIME)
+    else:
+        raise RuntimeError("Unknown solver!")
+    return paths
+
+
+def configure_heuristic_cache(args):
+    """Apply --heuristic-cache and --heuristic-cache-size to the heuristic cache of this process."""
+    if args.heuristic_cache:
+        heuristics.set_cache_dir(args.heuristic_cache)
+    if args.heuristic_cache_size is not None:
+        heuristics.set_cache_capacity(args.heuristic_cache_size * 2 ** 20)
+
+
+def solve_instance(file, args):
+    """Solve one instance file and return the sum of costs, used by the workers of --jobs.
+
+    Returns None if a search limit was hit, and an 'invalid' result if the paths are not a valid solution.
+    """
+    configure_heuristic_cache(args)
+    my_map, starts, goals = import_mapf_instance(file, args.agents)
+    paths = find_paths(my_map, starts, goals, args)
+    if paths is None:
+        return None
+    problems = validate_paths(my_map, starts, goals, paths)
+    if problems:
+        return {'status': 'invalid', 'error': '; '.join(problems)}
+    return get_sum_of_cost(paths)
+
+
+def build_parser():
+    """Return the parser of the command line arguments, whose defaults are also used by planning_service.py."""
     parser = argparse.ArgumentParser(description='Runs various MAPF algorithms')
     parser.add_argument('--instance', type=str, default=None,
-                        help='The name of the instance file(s)')
+                        help='The name of the instance file(s), in the format of instances/ or MovingAI .scen files')
+    parser.add_argument('--agents', type=int, default=None,
+                        help='Use only the first N agents of each instance')
     parser.add_argument('--batch', action='store_true', default=False,
                         help='Use batch output instead of animation')
     parser.add_argument('--disjoint', action='store_true', default=False,
                         help='Use the disjoint splitting')
     parser.add_argument('--solver', type=str, default=SOLVER,
-                        help='The solver to use (one of: {CBS,Independent,Prioritized}), defaults to ' + str(SOLVER))
+                        help='The solver to use (one of: {CBS,ECBS,Independent,Prioritized,LNS}), defaults to ' + str(SOLVER))
+    parser.add_argument('--low-level', type=str, default='a_star',
+                        help='Low-level planner of CBS, Independent, Prioritized and LNS (one of: {a_star,sipp}), '
+                             'defaults to a_star')
+    parser.add_argument('--heuristic-cache', type=str, default=None,
+                        help='Directory to persist heuristic tables in, reused by later runs on the same map')
+    parser.add_argument('--heuristic-cache-size', type=int, default=None,
+                        help='Megabytes of heuristic tables kept in memory by each process, defaults to '
+                             '{}'.format(heuristics.DEFAULT_CAPACITY // 2 ** 20))
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Solve the instances in N worker processes (implies --batch)')
+    parser.add_argument('--time-limit', type=float, default=None,
+                        help='Wall-clock seconds per instance with --jobs, reported as timeout when exceeded')
+    parser.add_argument('--memory-limit', type=int, default=None,
+                        help='Memory limit in MB per instance with --jobs')
+    parser.add_argument('--max-time', type=float, default=None,
+                        help='Stop the CBS or ECBS search after this many seconds, LNS runs for this long (default {}s)'.format(LNS_TIME))
+    parser.add_argument('--max-expansions', type=int, default=None,
+                        help='Stop the CBS or ECBS search after expanding this many nodes')
+    parser.add_argument('--node-limit', type=int, default=None,
+                        help='Stop CBS, ECBS or Prioritized when a low-level search stores more than N nodes, '
+                             'reported like a timeout')
+    parser.add_argument('--heuristic', type=str, default=None,
+                        help='Admissible high-level heuristic of CBS (one of: {CG,DG,WDG}), defaults to none')
+    parser.add_argument('--conflict-selection', type=str, default='cardinal',
+                        help='Collision CBS splits on (one of: {cardinal,first}), cardinal ones first using MDDs or '
+                             'the first one found, defaults to cardinal')
+    parser.add_argument('--w', type=float, default=1.1,
+                        help='Suboptimality factor of ECBS, the sum of costs is at most w times the optimal one')
+    parser.add_argument('--ordering', type=str, default='index',
+                        help='Priority order of prioritized planning (one of: {index,shortest,longest,congestion,random}), '
+                             'defaults to index')
+    parser.add_argument('--restarts', type=int, default=0,
+                        help='Random priority orders prioritized planning tries after the first one fails')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the random priority orders')
+    parser.add_argument('--restart-jobs', type=int, default=1,
+                        help='Try the priority orders in N worker processes')
+    parser.add_argument('--best', action='store_true', default=False,
+                        help='Try all priority orders and keep the solution with the smallest sum of costs')
+    parser.add_argument('--neighborhood', type=str, default='adaptive',
+                        help='Neighborhoods of LNS (one of: {random,agent,map,adaptive}), defaults to adaptive')
+    parser.add_argument('--neighborhood-size', type=int, default=8,
+                        help='Number of agents LNS replans per iteration')
+    parser.add_argument('--cat', action='store_true', default=False,
+                        help='Break ties of CBS low-level searches on collisions with the other paths')
+    parser.add_argument('--bypass', action='store_true', default=False,
+                        help='Adopt same-cost child paths with fewer collisions instead of branching in CBS')
+    parser.add_argument('--cbs-jobs', type=int, default=1,
+                        help='Replan the children of CBS nodes in N worker processes')
+    parser.add_argument('--top-k', type=int, default=1,
+                        help='Expand the K best CBS nodes together, their children are replanned at once')
+    parser.add_argument('--trace', type=str, default=None,
+                        help='Write a JSON lines trace of the CBS search to this file (without --jobs)')
+    parser.add_argument('--profile', action='store_true', default=False,
+                        help='Print counters and timers of the CBS search (without --jobs)')
+    return parser
 
-    args = parser.parse_args()
 
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+
+    configure_heuristic_cache(args)
 
     result_file = open("results.csv", "w", buffering=1)
 
-    for file in sorted(glob.glob(args.instance)):
-
-        print("***Import an instance***")
-        my_map, starts, goals = import_mapf_instance(file)
-        print_mapf_instance(my_map, starts, goals)
-
-        if args.solver == "CBS":
-            print("***Run CBS***")
-            cbs = CBSSolver(my_map, starts, goals)
-            paths = cbs.find_solution(args.disjoint)
-        elif args.solver == "Independent":
-            print("***Run Independent***")
-            solver = IndependentSolver(my_map, starts, goals)
-            paths = solver.find_solution()
-        elif args.solver == "Prioritized":
-            print("***Run Prioritized***")
-            solver = PrioritizedPlanningSolver(my_map, starts, goals)
-            paths = solver.find_solution()
-        else:
-            raise RuntimeError("Unknown solver!")
-
-        cost = get_sum_of_cost(paths)
-        result_file.write("{},{}\n".format(file, cost))
-
-
-        if not args.batch:
-            print("***Test paths on a simulation***")
-            animation = Animation(my_map, starts, goals, paths)
-            # animation.save("output.mp4", 1.0)
-            animation.show()
+    if args.jobs is not None:
+        solve = partial(solve_instance, args=args)
+        files = sorted(glob.glob(args.instance))
+        for file, result in run_batch(files, solve, args.jobs, args.time_limit, args.memory_limit):
+            if result['status'] == 'solved':
+                print("{}: sum of costs {} ({:.2f}s)".format(file, result['cost'], result['time']))
+                result_file.write("{},{}\n".format(file, result['cost']))
+            else:
+                print("{}: {} ({:.2f}s) {}".format(file, result['status'], result['time'], result.get('error', '')))
+                result_file.write("{},{}\n".format(file, result['status']))
+    else:
+        instrumentation = None
+        if args.trace or args.profile:
+            instrumentation = Instrumentation(args.trace)
+
+        for file in sorted(glob.glob(args.instance)):
+
+            print("***Import an instance***")
+            my_map, starts, goals = import_mapf_instance(file, args.agents)
+            print_mapf_instance(my_map, starts, goals)
+
+            if instrumentation is not None:
+                instrumentation.trace('instance', file=file)
+            paths = find_paths(get_map_context(my_map), starts, goals, args, instrumentation)
+            if paths is None:
+                print("***The search stopped at its limit***")
+                result_file.write("{},{}\n".format(file, 'timeout'))
+                continue
+
+            problems = validate_paths(my_map, starts, goals, paths)
+            if problems:
+                print("***Paths are not a valid solution***")
+                for problem in problems:
+                    print(problem)
+
+            cost = get_sum_of_cost(paths)
+            result_file.write("{},{}\n".format(file, cost))
+
+
+            if not args.batch:
+                from visualize import Animation  # needs matplotlib, not loaded for batch runs
+                print("***Test paths on a simulation***")
+                animation = Animation(my_map.tolist(), starts, goals, paths)
+                # animation.save("output.mp4", 1.0)
+                animation.show()
+
+        if instrumentation is not None:
+            if args.profile:
+                instrumentation.print_summary()
+            instrumentation.close()
     result_file.close()
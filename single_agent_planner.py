@@ -1,4 +1,6 @@
 import heapq
+from heuristics import compute_distance_table
+from focal_list import FocalList
 
 def move(loc, dir):
     directions = [(0, -1), (1, 0), (0, 1), (-1, 0), (0, 0)]
@@ -12,39 +14,10 @@ def get_sum_of_cost(paths):
     return rst
 
 
-def compute_heuristics(my_map, goal):
-    # Use Dijkstra to build a shortest-path tree rooted at the goal location
-    open_list = []
-    closed_list = dict()
-    root = {'loc': goal, 'cost': 0}
-    heapq.heappush(open_list, (root['cost'], goal, root))
-    closed_list[goal] = root
-    while len(open_list) > 0:
-        (cost, loc, curr) = heapq.heappop(open_list)
-        for dir in range(4):
-            child_loc = move(loc, dir)
-            child_cost = cost + 1
-            if child_loc[0] < 0 or child_loc[0] >= len(my_map) \
-               or child_loc[1] < 0 or child_loc[1] >= len(my_map[0]):
-               continue
-            if my_map[child_loc[0]][child_loc[1]]:
-                continue
-            child = {'loc': child_loc, 'cost': child_cost}
-            if child_loc in closed_list:
-                existing_node = closed_list[child_loc]
-                if existing_node['cost'] > child_cost:
-                    closed_list[child_loc] = child
-                    # open_list.delete((existing_node['cost'], existing_node['loc'], existing_node))
-                    heapq.heappush(open_list, (child_cost, child_loc, child))
-            else:
-                closed_list[child_loc] = child
-                heapq.heappush(open_list, (child_cost, child_loc, child))
-
-    # build the heuristics table
-    h_values = dict()
-    for loc, node in closed_list.items():
-        h_values[loc] = node['cost']
-    return h_values
+def compute_heuristics(grid, goal):
+    # Use a breadth-first search to build a shortest-path tree rooted at the goal cell
+    # h_values[cell] is the distance from cell to goal, or -1 if the goal cannot be reached
+    return compute_distance_table(grid, [goal])[0]
 
 
 def build_constraint_table(constraints, agent):
@@ -54,15 +27,70 @@ def build_constraint_table(constraints, agent):
     #               for a more efficient constraint violation check in the 
     #               is_constrained function.
 
-    # filter constraints for the given agent
-    agent_constraints = [c for c in constraints if c['agent'] == agent]
+    # vertex      - timestep -> set of forbidden locations
+    # edge        - timestep -> set of forbidden (from, to) moves
+    # permanent   - location -> timestep after which the location is forbidden forever (at_goal constraints)
+    # positive    - timestep -> the location ([v]) or move ([u, v]) the agent is forced to take (disjoint splitting)
+    # latest      - latest timestep of a constraint, from then on only the permanent constraints change anything
+    if isinstance(constraints, dict):
+        # already a constraint table, see prioritized.avoidance_table
+        return constraints
+    constraint_table = {'vertex': dict(), 'edge': dict(), 'permanent': dict(), 'positive': dict(), 'latest': 0}
+    for constraint in constraints:
+        if constraint['agent'] == agent:
+            add_constraint(constraint_table, constraint)
+        elif constraint.get('positive', False):
+            # Task 4.2: another agent is forced to this location or move, so this agent must stay away from it
+            for negative in negative_constraints(constraint, agent):
+                add_constraint(constraint_table, negative)
+
+    return constraint_table
+
+
+def add_constraint(constraint_table, constraint):
+    """Index a single constraint into a table built by build_constraint_table."""
+    loc = constraint['loc']
+    timestep = constraint['timestep']
+    constraint_table['latest'] = max(constraint_table['latest'], timestep)
+    if constraint.get('positive', False):
+        constraint_table['positive'][timestep] = loc
+    # edge constraint
+    elif len(loc) == 2:
+        constraint_table['edge'].setdefault(timestep, set()).add((loc[0], loc[1]))
+    # vertex constraint
+    else:
+        constraint_table['vertex'].setdefault(timestep, set()).add(loc[0])
+        # case for 2.3, the location stays forbidden for all future time steps
+        if constraint.get('at_goal', False):
+            permanent = constraint_table['permanent']
+            if loc[0] not in permanent or timestep < permanent[loc[0]]:
+                permanent[loc[0]] = timestep
+
+
+def constraint_key(constraint):
+    """Return a hashable key that identifies a constraint."""
+    return (constraint['agent'], tuple(constraint['loc']), constraint['timestep'],
+            constraint.get('positive', False), constraint.get('at_goal', False))
 
-    # sort constraints by time step
-    agent_constraints.sort(key=lambda x: x['timestep'])
 
-    return agent_constraints
+def constraint_set_key(constraints, agent):
+    """Return an order-independent key of the constraints that affect agent, see build_constraint_table."""
+    return frozenset(constraint_key(constraint) for constraint in constraints
+                     if constraint['agent'] == agent or constraint.get('positive', False))
 
 
+def negative_constraints(positive, agent):
+    """Return the negative constraints for agent that follow from the positive constraint of another agent."""
+    loc = positive['loc']
+    timestep = positive['timestep']
+    # vertex constraint: the location is taken at the timestep
+    if len(loc) == 1:
+        return [{'agent': agent, 'loc': [loc[0]], 'timestep': timestep}]
+    # edge constraint: both ends of the move are taken and the move cannot be crossed in the other direction
+    return [{'agent': agent, 'loc': [loc[0]], 'timestep': timestep - 1},
+            {'agent': agent, 'loc': [loc[1]], 'timestep': timestep},
+            {'agent': agent, 'loc': [loc[1], loc[0]], 'timestep': timestep}]
+
 
 def get_location(path, time):
     if time < 0:
@@ -73,12 +101,26 @@ def get_location(path, time):
         return path[-1]  # wait at the goal location
 
 
+class Node(object):
+    """A node of the space-time A* search. Slotted to keep the closed list small."""
+
+    __slots__ = ('loc', 'g_val', 'h_val', 'parent', 'time_step', 'conflicts')
+
+    def __init__(self, loc, g_val, h_val, parent, time_step, conflicts=0):
+        self.loc = loc
+        self.g_val = g_val
+        self.h_val = h_val
+        self.parent = parent
+        self.time_step = time_step
+        self.conflicts = conflicts  # collisions with the paths of the conflict avoidance table so far
+
+
 def get_path(goal_node):
     path = []
     curr = goal_node
     while curr is not None:
-        path.append(curr['loc'])
-        curr = curr['parent']
+        path.append(curr.loc)
+        curr = curr.parent
     path.reverse()
     return path
 
@@ -89,55 +131,108 @@ def is_constrained(curr_loc, next_loc, next_time, constraint_table):
     #               any given constraint. For efficiency the constraints are indexed in a constraint_table
     #               by time step, see build_constraint_table.
 
-    for constraint in constraint_table:
-        if constraint['timestep'] == next_time:
-            # edge constraint
-            if len(constraint['loc']) == 2:
-                if curr_loc == constraint['loc'][0] and next_loc == constraint['loc'][1]:
-                    return True
-            # vertex constraint
-            else:
-                if next_loc == constraint['loc'][0]:
-                    return True
-
-        # case for 2.3, constraints for all future time steps
-        # if this constraint is a goal constraint (prevents the agent from colliding with others already at the goal)
-        elif next_time > constraint['timestep']:
-            if constraint.get('at_goal', False) and next_loc == constraint['loc'][0]:
+    # Task 4.2: positive constraints force the agent to a location or move
+    positive = constraint_table['positive'].get(next_time)
+    if positive is not None:
+        if len(positive) == 1:
+            if next_loc != positive[0]:
                 return True
+        elif curr_loc != positive[0] or next_loc != positive[1]:
+            return True
+
+    vertices = constraint_table['vertex'].get(next_time)
+    if vertices is not None and next_loc in vertices:
+        return True
+
+    edges = constraint_table['edge'].get(next_time)
+    if edges is not None and (curr_loc, next_loc) in edges:
+        return True
+
+    # case for 2.3, constraints for all future time steps
+    # if this constraint is a goal constraint (prevents the agent from colliding with others already at the goal)
+    permanent = constraint_table['permanent'].get(next_loc)
+    if permanent is not None and next_time > permanent:
+        return True
 
     return False
 
 
 
 def push_node(open_list, node):
-    heapq.heappush(open_list, (node['g_val'] + node['h_val'], node['h_val'], node['loc'], node['time_step'], node))
+    heapq.heappush(open_list, (node.g_val + node.h_val, node.conflicts, node.h_val, node.loc, node.time_step, node))
 
 
 def pop_node(open_list):
-    _, _, _, _, curr = heapq.heappop(open_list)
+    _, _, _, _, _, curr = heapq.heappop(open_list)
     return curr
 
 
 def compare_nodes(n1, n2):
     """Return true is n1 is better than n2."""
     # fix ties
-    if n1['g_val'] + n1['h_val'] == n2['g_val'] + n2['h_val']:
+    if n1.g_val + n1.h_val == n2.g_val + n2.h_val:
+        if n1.g_val == n2.g_val:
+            # prefer fewer collisions with the conflict avoidance table
+            return n1.conflicts < n2.conflicts
         # prefer higher g-val
-        return n1['g_val'] < n2['g_val']
-    return n1['g_val'] + n1['h_val'] < n2['g_val'] + n2['h_val']
+        return n1.g_val < n2.g_val
+    return n1.g_val + n1.h_val < n2.g_val + n2.h_val
+
+
+def compute_max_path_length(grid, constraint_table):
+    """Return an upper bound of the length of a shortest path under the constraints of constraint_table.
+
+    After the latest constraint only the permanent constraints are left, so from where the agent is
+    then a shortest path visits every other cell that is free and not permanently blocked at most once.
+    """
+    return constraint_table['latest'] + grid.num_free - len(constraint_table['permanent'])
+
+
+def compute_earliest_goal_timestep(constraint_table, goal_loc):
+    """Return the earliest timestep the agent may reach goal_loc and stay there, see build_constraint_table."""
+
+    # 1.4 the agent cannot stay at its goal before the latest vertex constraint there. This includes
+    #     the constraints that stop it from blocking the goal while another agent is forced through it
+    earliest_goal_timestep = 0
+    for timestep, vertices in constraint_table['vertex'].items():
+        if timestep > earliest_goal_timestep and goal_loc in vertices:
+            earliest_goal_timestep = timestep
+
+    # Task 4.2: the agent cannot stop before it has met its positive constraints
+    for timestep, positive in constraint_table['positive'].items():
+        if timestep > earliest_goal_timestep and positive != [goal_loc]:
+            earliest_goal_timestep = timestep
+    return earliest_goal_timestep
+
 
+def horizon_timestep(constraint_table, cat=None):
+    """Return the timestep from which the constraints, and the paths of cat, no longer change with time."""
+    if cat is None:
+        return constraint_table['latest']
+    return max(constraint_table['latest'], cat.horizon())
 
-def compute_max_path_length(my_map):
-    return len(my_map) * len(my_map[0])
 
+class NodeLimitReached(Exception):
+    """Raised by a low-level search that stores more nodes than its node_limit.
 
-def a_star(my_map, start_loc, goal_loc, h_values, agent, constraints):
-    """ my_map      - binary obstacle map
-        start_loc   - start position
-        goal_loc    - goal position
+    The search gave up, so unlike a result of None it does not mean there is no path.
+    The solvers stop and report the limit instead of pruning the agent or node.
+    """
+
+
+def a_star(grid, start_loc, goal_loc, h_values, agent, constraints, node_limit=None, cat=None, instrumentation=None):
+    """ grid        - Grid built from the binary obstacle map
+        start_loc   - start cell
+        goal_loc    - goal cell
+        h_values    - distances to the goal indexed by cell, see compute_heuristics
         agent       - the agent that is being re-planned
-        constraints - constraints defining where robot should or cannot go at each timestep
+        constraints - constraints defining where robot should or cannot go at each timestep, or a
+                      constraint table of the agent as returned by build_constraint_table
+        node_limit  - raise NodeLimitReached once more than this many nodes are stored, bounds the memory of
+                      the search
+        cat         - conflict avoidance table, a ReservationTable with the paths of the other agents. Among
+                      the paths of minimum length the search prefers the ones with fewer collisions with it
+        instrumentation - Instrumentation that counts the searches and their expanded and generated nodes
     """
 
     ##############################
@@ -145,83 +240,158 @@ def a_star(my_map, start_loc, goal_loc, h_values, agent, constraints):
     #           rather than space domain, only.
 
     open_list = []
+    # keyed by the packed (loc, time_step) pair time_step * grid.size + loc. After the horizon
+    # nothing depends on time any more, so the timesteps after it share one key per location
     closed_list = dict()
+    size = grid.size
 
-    # the earliest timestep the agent can reach the goal
-    # 1.4 if there is a goal constraint, earliest_goal_timestep is the timestep of the constraint
-    # if any([(c['loc'][0] == goal_loc) for c in constraints]):
-    #     earliest_goal_timestep = min([c['timestep'] for c in constraints if c['loc'][0] == goal_loc])
-    # else:
-    #     earliest_goal_timestep = 0
+    h_value = h_values[start_loc]
+    if h_value < 0:
+        return None  # the goal is not reachable from the start
 
-    earliest_goal_timestep = 0
-    for constraint in constraints:
-        if constraint['agent'] == agent and constraint['loc'][0] == goal_loc:
-            earliest_goal_timestep = constraint['timestep']
-            break
+    constraint_table = build_constraint_table(constraints, agent)
+    if goal_loc in constraint_table['permanent']:
+        return None  # the agent can never stay at its goal
+    successors = grid.successors
 
+    earliest_goal_timestep = compute_earliest_goal_timestep(constraint_table, goal_loc)
 
     # 2.4 upper bound on for path length
-    max_path_length = compute_max_path_length(my_map)
+    max_path_length = compute_max_path_length(grid, constraint_table)
+    horizon = horizon_timestep(constraint_table, cat) + 1
+
+    root = Node(start_loc, 0, h_value, None, 0)
+    push_node(open_list, root)
+    closed_list[root.loc] = root
+    num_of_expanded = 0
+    num_of_generated = 1
+    try:
+        while len(open_list) > 0:
+            curr = pop_node(open_list)
+            if closed_list[min(curr.time_step, horizon) * size + curr.loc] is not curr:
+                continue  # replaced by a better node
+            num_of_expanded += 1
+            #############################
+            # Task 1.4: Adjust the goal test condition to handle goal constraints
+            if curr.loc == goal_loc and curr.time_step >= earliest_goal_timestep: #
+                return get_path(curr)
+
+            # 2.4 terminate the search if the path length exceeds the upper bound
+            if curr.g_val > max_path_length:
+                return None
+
+            if node_limit is not None and len(closed_list) > node_limit:
+                raise NodeLimitReached()
+
+            # iterate over all possible moves, including waiting in the current cell
+            time_step = curr.time_step + 1
+            for child_loc in successors[curr.loc]:
+                # check if the move violates any constraint
+                if is_constrained(curr.loc, child_loc, time_step, constraint_table):
+                    continue
+
+                conflicts = curr.conflicts
+                if cat is not None:
+                    conflicts += cat.count_conflicts(agent, curr.loc, child_loc, time_step)
+                child = Node(child_loc, curr.g_val + 1, h_values[child_loc], curr, time_step, conflicts)
+
+                key = min(time_step, horizon) * size + child_loc
+                existing_node = closed_list.get(key)
+                if existing_node is None or compare_nodes(child, existing_node):
+                    closed_list[key] = child
+                    push_node(open_list, child)
+                    num_of_generated += 1
+
+        return None  # Failed to find solutions
+    finally:
+        record_search(instrumentation, num_of_expanded, num_of_generated)
+
+
+def record_search(instrumentation, num_of_expanded, num_of_generated):
+    """Count a low-level search and its nodes in instrumentation, if there is one."""
+    if instrumentation is not None:
+        instrumentation.count('low_level_searches')
+        instrumentation.count('low_level_expanded', num_of_expanded)
+        instrumentation.count('low_level_generated', num_of_generated)
+
+
+def get_planner(name):
+    """Return the low-level planner called name: 'a_star' or 'sipp' (see sipp.py). Both take the arguments of a_star."""
+    if name == 'a_star':
+        return a_star
+    if name == 'sipp':
+        from sipp import sipp  # sipp.py builds on this module
+        return sipp
+    raise RuntimeError("Unknown low-level planner: {}".format(name))
+
+
+def focal_a_star(grid, start_loc, goal_loc, h_values, agent, constraints, w, cat=None, node_limit=None,
+                 instrumentation=None):
+    """ Focal search variant of a_star for bounded-suboptimal planning.
+
+        Among the nodes with f <= w * f_min it expands the one with the fewest collisions with
+        cat, f_min being the smallest f of the nodes not yet expanded. The arguments are the ones
+        of a_star, w >= 1 is the suboptimality factor.
+        Returns (path, f_min): f_min is a lower bound of the length of the shortest path and the
+        length of path is at most w * f_min. Returns (None, None) if no path was found.
+    """
+
+    open_list = FocalList(w)
+    closed_list = dict()
+    size = grid.size
 
     h_value = h_values[start_loc]
+    if h_value < 0:
+        return None, None  # the goal is not reachable from the start
 
     constraint_table = build_constraint_table(constraints, agent)
-
-    root = {'loc': start_loc, 'g_val': 0, 'h_val': h_value, 'parent': None, 'time_step': 0}
-    push_node(open_list, root)
-    closed_list[(root['loc'], 0)] = root
-    while len(open_list) > 0:
-        curr = pop_node(open_list)
-        #############################
-        # Task 1.4: Adjust the goal test condition to handle goal constraints
-        if curr['loc'] == goal_loc and curr['time_step'] >= earliest_goal_timestep: #
-            return get_path(curr)
-
-        # 2.4 terminate the search if the path length exceeds the upper bound
-        if curr['g_val'] > max_path_length:
-            return None
-
-        # iterate over all possible moves
-        for dir in range(5):
-            child_loc = move(curr['loc'], dir)
-
-            # print(child_loc)
-            #
-            # print(my_map[child_loc[0]][child_loc[1]])
-
-            # check if the move is within the map
-            if child_loc[0] < 0 or child_loc[0] >= len(my_map) \
-               or child_loc[1] < 0 or child_loc[1] >= len(my_map[0]):
-                continue
-
-            if my_map[child_loc[0]][child_loc[1]]:
-                continue
-
-            # check if the move violates any constraint
-            if is_constrained(curr['loc'], child_loc, curr['time_step'] + 1, constraint_table):
-                continue
-
-            child = {'loc': child_loc,
-                    'g_val': curr['g_val'] + 1,
-                    'h_val': h_values[child_loc],
-                    'parent': curr,
-                    'time_step': curr['time_step'] + 1}
-
-            if (child['loc'], child['time_step']) in closed_list:
-                existing_node = closed_list[(child['loc'], child['time_step'])]
-                if compare_nodes(child, existing_node):
-                    closed_list[(child['loc'], child['time_step'])] = child
-                    push_node(open_list, child)
-            else:
-                closed_list[(child['loc'], child['time_step'])] = child
-                push_node(open_list, child)
-
-        # case for waiting in current cell
-        # child = {'loc': curr['loc'],
-        #         'g_val': curr['g_val'] + 1,
-        #         'h_val': h_values[curr['loc']],
-        #         'parent': curr,
-        #         'time_step': curr['time_step'] + 1}
-
-    return None  # Failed to find solutions
+    if goal_loc in constraint_table['permanent']:
+        return None, None  # the agent can never stay at its goal
+    successors = grid.successors
+
+    earliest_goal_timestep = compute_earliest_goal_timestep(constraint_table, goal_loc)
+    max_path_length = compute_max_path_length(grid, constraint_table)
+    horizon = horizon_timestep(constraint_table, cat) + 1
+
+    root = Node(start_loc, 0, h_value, None, 0)
+    open_list.push(h_value, (0, h_value, start_loc, 0), root)
+    closed_list[root.loc] = root
+    num_of_expanded = 0
+    num_of_generated = 1
+    try:
+        while len(open_list) > 0:
+            f_min = open_list.lower_bound()
+            curr = open_list.pop()
+            if closed_list[min(curr.time_step, horizon) * size + curr.loc] is not curr:
+                continue  # replaced by a better node
+            num_of_expanded += 1
+            if curr.loc == goal_loc and curr.time_step >= earliest_goal_timestep:
+                return get_path(curr), f_min
+
+            if curr.g_val > max_path_length:
+                return None, None
+
+            if node_limit is not None and len(closed_list) > node_limit:
+                raise NodeLimitReached()
+
+            time_step = curr.time_step + 1
+            for child_loc in successors[curr.loc]:
+                if is_constrained(curr.loc, child_loc, time_step, constraint_table):
+                    continue
+
+                conflicts = curr.conflicts
+                if cat is not None:
+                    conflicts += cat.count_conflicts(agent, curr.loc, child_loc, time_step)
+                child = Node(child_loc, curr.g_val + 1, h_values[child_loc], curr, time_step, conflicts)
+
+                key = min(time_step, horizon) * size + child_loc
+                existing_node = closed_list.get(key)
+                if existing_node is None or compare_nodes(child, existing_node):
+                    closed_list[key] = child
+                    f = child.g_val + child.h_val
+                    open_list.push(f, (conflicts, f, child.h_val, child_loc, time_step), child)
+                    num_of_generated += 1
+
+        return None, None
+    finally:
+        record_search(instrumentation, num_of_expanded, num_of_generated)
@@ -0,0 +1,145 @@
+import heapq
+from single_agent_planner import NodeLimitReached, a_star, build_constraint_table, compute_earliest_goal_timestep, \
+    record_search
+
+INFINITY = float('inf')
+
+
+def safe_intervals(blocked_times, permanent=None):
+    """Return the maximal [start, end] intervals of timesteps at which a cell is free, in increasing order.
+
+    blocked_times   - increasing timesteps at which the cell is taken
+    permanent       - timestep from which on the cell is taken forever, None if never
+    """
+    intervals = []
+    start = 0
+    for t in blocked_times:
+        if permanent is not None and t >= permanent:
+            break
+        if t > start:
+            intervals.append((start, t - 1))
+        start = max(start, t + 1)
+    end = INFINITY if permanent is None else permanent - 1
+    if start <= end:
+        intervals.append((start, end))
+    return intervals
+
+
+class SIPPNode(object):
+    """A node of safe interval path planning: the agent arrives at loc at g_val within its interval-th safe interval."""
+
+    __slots__ = ('loc', 'interval', 'g_val', 'h_val', 'parent')
+
+    def __init__(self, loc, interval, g_val, h_val, parent):
+        self.loc = loc
+        self.interval = interval
+        self.g_val = g_val
+        self.h_val = h_val
+        self.parent = parent
+
+
+def get_sipp_path(goal_node, end_time):
+    """Return the path of goal_node as one location per timestep, waiting wherever the agent arrives early."""
+    arrivals = []
+    curr = goal_node
+    while curr is not None:
+        arrivals.append((curr.loc, curr.g_val))
+        curr = curr.parent
+    arrivals.reverse()
+    path = []
+    for i in range(len(arrivals)):
+        loc, arrival = arrivals[i]
+        departure = arrivals[i + 1][1] if i + 1 < len(arrivals) else end_time + 1
+        path.extend([loc] * (departure - arrival))
+    return path
+
+
+def sipp(grid, start_loc, goal_loc, h_values, agent, constraints, node_limit=None, cat=None, instrumentation=None):
+    """ Safe interval path planning, a drop-in replacement of a_star with the same arguments and result.
+
+        Searches over (cell, safe interval) pairs instead of (cell, timestep) pairs, so waiting
+        costs no expansions. Returns a shortest path, like a_star. Positive constraints and a
+        conflict avoidance table are not supported, for them the search is left to a_star.
+    """
+
+    constraint_table = build_constraint_table(constraints, agent)
+    if constraint_table['positive'] or cat is not None:
+        return a_star(grid, start_loc, goal_loc, h_values, agent, constraints, node_limit, cat, instrumentation)
+
+    h_value = h_values[start_loc]
+    if h_value < 0:
+        return None  # the goal is not reachable from the start
+    if goal_loc in constraint_table['permanent']:
+        return None  # the agent can never stay at its goal
+
+    # timesteps at which each constrained cell is taken
+    blocked = dict()
+    for t, cells in constraint_table['vertex'].items():
+        for cell in cells:
+            blocked.setdefault(cell, []).append(t)
+    permanent = constraint_table['permanent']
+    edges = constraint_table['edge']
+    intervals = dict()
+
+    def get_intervals(cell):
+        if cell not in intervals:
+            intervals[cell] = safe_intervals(sorted(blocked.get(cell, ())), permanent.get(cell))
+        return intervals[cell]
+
+    start_intervals = get_intervals(start_loc)
+    if not start_intervals or start_intervals[0][0] > 0:
+        # the start is taken at timestep 0, which a_star ignores
+        return a_star(grid, start_loc, goal_loc, h_values, agent, constraints, node_limit,
+                      instrumentation=instrumentation)
+
+    # the agent cannot stop at its goal earlier than this, so no path is shorter
+    earliest_goal_timestep = compute_earliest_goal_timestep(constraint_table, goal_loc)
+    neighbors = grid.neighbors
+
+    open_list = []
+    # earliest arrival time at every (cell, interval) pair
+    arrivals = {(start_loc, 0): 0}
+    root = SIPPNode(start_loc, 0, 0, h_value, None)
+    heapq.heappush(open_list, (max(h_value, earliest_goal_timestep), h_value, start_loc, 0, 0, root))
+    num_of_expanded = 0
+    num_of_generated = 1
+    try:
+        while len(open_list) > 0:
+            _, _, _, _, _, curr = heapq.heappop(open_list)
+            if arrivals[(curr.loc, curr.interval)] < curr.g_val:
+                continue  # reached earlier by another node
+            num_of_expanded += 1
+            _, end = get_intervals(curr.loc)[curr.interval]
+            if curr.loc == goal_loc and end == INFINITY:
+                return get_sipp_path(curr, max(curr.g_val, earliest_goal_timestep))
+
+            if node_limit is not None and num_of_generated > node_limit:
+                raise NodeLimitReached()
+
+            for child_loc in neighbors[curr.loc]:
+                for i, (child_start, child_end) in enumerate(get_intervals(child_loc)):
+                    # the agent leaves curr.loc at time - 1, while it is still safe there
+                    if child_start > end + 1:
+                        break
+                    if child_end <= curr.g_val:
+                        continue
+                    time = max(curr.g_val + 1, child_start)
+                    while time <= child_end and time - 1 <= end and \
+                            (curr.loc, child_loc) in edges.get(time, ()):
+                        time += 1
+                    if time > child_end or time - 1 > end:
+                        continue
+
+                    key = (child_loc, i)
+                    if key in arrivals and arrivals[key] <= time:
+                        continue
+                    arrivals[key] = time
+                    h_value = h_values[child_loc]
+                    child = SIPPNode(child_loc, i, time, h_value, curr)
+                    heapq.heappush(open_list, (max(time + h_value, earliest_goal_timestep), h_value, child_loc, time,
+                                               i, child))
+                    num_of_generated += 1
+
+        return None  # Failed to find solutions
+    finally:
+        record_search(instrumentation, num_of_expanded, num_of_generated)
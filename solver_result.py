@@ -0,0 +1,26 @@
+class SolverResult(object):
+    """Outcome of a search that may stop at a time or expansion limit."""
+
+    def __init__(self, paths=None, sum_of_costs=None, expanded=0, generated=0, CPU_time=0, timed_out=False):
+        """paths        - [[(x11, y11), (x12, y12), ...], ...] one path per agent, None if no solution was found
+        sum_of_costs    - sum of costs of paths, None if no solution was found
+        expanded        - number of expanded high-level nodes
+        generated       - number of generated high-level nodes
+        CPU_time        - seconds spent in the search
+        timed_out       - True if the search stopped at max_time or max_expansions before it finished
+        """
+
+        self.paths = paths
+        self.sum_of_costs = sum_of_costs
+        self.expanded = expanded
+        self.generated = generated
+        self.CPU_time = CPU_time
+        self.timed_out = timed_out
+
+    @property
+    def solved(self):
+        return self.paths is not None
+
+    def __repr__(self):
+        return 'SolverResult(solved={}, sum_of_costs={}, expanded={}, generated={}, CPU_time={:.2f}, timed_out={})'.format(
+            self.solved, self.sum_of_costs, self.expanded, self.generated, self.CPU_time, self.timed_out)